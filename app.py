@@ -10,84 +10,196 @@ user data and conversation history.
 """
 
 import os
+import logging
+import re
+import json
+import asyncio
+import secrets
+import zlib
+import functools
+import hashlib
+import importlib.util
+from contextlib import asynccontextmanager
+import httpx
+import msgspec
+import orjson
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
-from fastapi import FastAPI, HTTPException, Depends, status, Query, Body, Path
-from fastapi.middleware.cors import CORSMiddleware
+from typing_extensions import TypedDict
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Body, Path, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, Field
+from starlette.middleware.gzip import GZipMiddleware
+from jose import JWTError, jwt
+from pydantic import BaseModel, ConfigDict, Field
+from bson import ObjectId
+from pymongo import AsyncMongoClient, MongoClient
 from dotenv import load_dotenv
 
-from weather_agent import create_weather_agent
+from weather_agent import (
+    build_agent_executor,
+    create_weather_agent,
+    current_agent_executor,
+    reset_agent_components,
+    set_http_client,
+)
 from user_manager import UserManager
+from memory_handler import (
+    clear_session_history,
+    ensure_history_indexes,
+    mongo_pool_options,
+    needs_history,
+    set_async_client,
+    set_client,
+)
 from prompt_cache import PromptCache
 from logger_config import setup_logger
+from middleware import CORSAuthMiddleware
 
 # Set up logger
 logger = setup_logger(__name__)
+# Bound once for the per-request chat and history paths
+log_debug, log_info, log_error = logger.debug, logger.info, logger.error
 
 # Load environment variables
 load_dotenv()
 
-# Initialize FastAPI app with metadata
-app = FastAPI(
-    title="Weather Agent API",
-    description="""
-    REST API for interacting with the LangChain Weather Agent.
-    
-    This API provides endpoints for:
-    - User management (signup, login, deletion)
-    - Weather agent chat interactions
-    - Chat history management
-    
-    All endpoints except signup and login require authentication.
-    """,
-    version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc",
-)
+# Interactive docs and the OpenAPI schema are not served in production
+IS_PRODUCTION = os.getenv("APP_ENV", "").lower() == "production"
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
+# Development-only routes such as /run-test are opt-in
+ENABLE_TEST_ROUTES = os.getenv("ENABLE_TEST_ROUTES", "").lower() in ("1", "true", "yes")
+if ENABLE_TEST_ROUTES:
+    from test_memory import test_conversation_memory
 
-# Initialize prompt cache on startup
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Initialize resources when the application starts.
+    Manage application-wide resources.
     
-    This function is called when the FastAPI application starts up.
-    It initializes the prompt cache and logs the startup event.
+    On startup this creates the shared MongoDB client and user manager and
+    initializes the prompt cache. On shutdown the MongoDB clients are closed.
     """
     logger.info("Starting Weather Agent API")
     
+    # One pooled MongoDB client shared by everything that needs it
+    app.state.mongo = MongoClient(os.getenv("MONGO_URI"), **mongo_pool_options())
+    # Chat histories reuse the same client instead of opening one per user
+    set_client(app.state.mongo)
+    # UserManager creates its index on construction, which is a blocking round-trip
+    app.state.user_manager = await run_in_threadpool(UserManager, client=app.state.mongo)
+    # Async client for chat-history reads and writes made from request handlers
+    app.state.mongo_async = AsyncMongoClient(os.getenv("MONGO_URI"), **mongo_pool_options())
+    set_async_client(app.state.mongo_async)
+    # Index chat history up front rather than on the first agent build
+    history_collection = app.state.mongo[os.getenv("MONGO_DB")][os.getenv("MONGO_COLLECTION")]
+    await run_in_threadpool(ensure_history_indexes, history_collection)
+    
+    # One bounded HTTP connection pool shared by every agent's weather tools
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        ),
+        timeout=float(os.getenv("HTTP_TIMEOUT", "10.0")),
+        # Multiplex concurrent requests over one connection when the h2 extra is installed
+        http2=importlib.util.find_spec("h2") is not None,
+    )
+    set_http_client(app.state.http)
+    
     try:
         # Initialize the prompt cache
         logger.debug("Initializing prompt cache")
-        prompt_cache = PromptCache()
-        prompt_cache.initialize_cache()
+        # The constructor pulls the hub prompts, so keep it off the event loop
+        prompt_cache = await run_in_threadpool(PromptCache)
+        app.state.prompt_cache = prompt_cache
         
         # Log the available prompts
         prompts = prompt_cache.get_prompt_ids()
-        logger.info(f"Prompt cache initialized with {len(prompts)} prompts: {', '.join(prompts)}")
+        logger.info("Prompt cache initialized with %s prompts: %s", len(prompts), ', '.join(prompts))
+        
+        # Build the shared model, tools, prompt and executor before the first request
+        logger.debug("Warming shared agent components")
+        await run_in_threadpool(build_agent_executor)
         
         logger.info("Weather Agent API started successfully")
     except Exception as e:
-        logger.critical(f"Failed to initialize application: {str(e)}", exc_info=True)
+        logger.critical("Failed to initialize application: %s", e, exc_info=True)
+    
+    yield
+    
+    logger.info("Shutting down Weather Agent API")
+    agent_cache.clear()
+    set_http_client(None)
+    await app.state.http.aclose()
+    set_client(None)
+    set_async_client(None)
+    await app.state.mongo_async.close()
+    app.state.mongo.close()
 
-# Initialize user manager
-user_manager = UserManager()
+# Initialize FastAPI app with metadata
+app = FastAPI(
+    title="Weather Agent API",
+    description="""
+    REST API for interacting with the LangChain Weather Agent.
+    
+    This API provides endpoints for:
+    - User management (signup, login, deletion)
+    - Weather agent chat interactions
+    - Chat history management
+    
+    All endpoints except signup and login require authentication.
+    """,
+    version="1.0.0",
+    docs_url=None if IS_PRODUCTION else "/docs",
+    redoc_url=None if IS_PRODUCTION else "/redoc",
+    openapi_url=None if IS_PRODUCTION else "/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
-# OAuth2 password bearer for token authentication
+# OAuth2 password bearer for token authentication. Tokens are checked by
+# CORSAuthMiddleware; the scheme is only declared in the OpenAPI schema so the
+# docs' Authorize button works, instead of being re-run on every request.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+BEARER_AUTH_OPENAPI = {"security": [{oauth2_scheme.scheme_name: []}]}
 
-# Cache for agent instances to avoid recreating them for each request
-agent_cache = {}
+_build_openapi = app.openapi
+
+@functools.lru_cache(maxsize=1)
+def _openapi():
+    """Build the OpenAPI schema once, with the bearer scheme the protected routes refer to."""
+    schema = _build_openapi()
+    security_schemes = schema.setdefault("components", {}).setdefault("securitySchemes", {})
+    security_schemes[oauth2_scheme.scheme_name] = oauth2_scheme.model.model_dump(
+        mode="json", by_alias=True, exclude_none=True
+    )
+    return schema
+
+# The schema only depends on the registered routes, so build it once
+app.openapi = _openapi
+
+# JWT settings
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+if not JWT_SECRET_KEY:
+    # Tokens signed with a per-process key don't survive restarts or work across workers
+    logger.warning("JWT_SECRET_KEY not set; using a random key for this process")
+    JWT_SECRET_KEY = secrets.token_urlsafe(32)
+
+# Bounds for the agent cache (each entry holds a full agent plus its memory)
+AGENT_CACHE_MAXSIZE = int(os.getenv("AGENT_CACHE_MAXSIZE", "256"))
+AGENT_CACHE_TTL = int(os.getenv("AGENT_CACHE_TTL", "1800"))
+
+# Recently validated users, so warm requests skip the MongoDB lookup.
+# The TTL is kept short so deletions made by other workers propagate quickly.
+AUTH_CACHE_MAXSIZE = int(os.getenv("AUTH_CACHE_MAXSIZE", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+auth_cache = TTLCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_CACHE_TTL)
 
 #
 # Pydantic models for request/response
@@ -97,116 +209,473 @@ class QueryRequest(BaseModel):
     """Model for chat query requests"""
     query: str = Field(..., description="The user's query to the weather agent")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "query": "What's the weather like in London today?"
             }
         }
+    )
 
 class QueryResponse(BaseModel):
     """Model for chat query responses"""
     response: str = Field(..., description="The agent's response to the query")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
             "example": {
                 "response": "The current weather in London is 12°C with light rain. Humidity is at 85% and wind speed is 10 km/h."
             }
         }
+    )
     
+class ChatMessage(TypedDict):
+    """A chat history message as returned by the API"""
+    role: str
+    content: str
+
+# Stored LangChain message type -> API role; anything else is the assistant
+MESSAGE_ROLES = {"human": "user"}
+
 class ChatHistoryResponse(BaseModel):
     """Model for chat history responses"""
-    messages: List[Dict[str, str]] = Field(..., description="List of chat messages with role and content")
+    messages: List[ChatMessage] = Field(..., description="List of chat messages with role and content")
+    next_cursor: Optional[str] = Field(None, description="Pass as after_id to get the messages after this page")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
             "example": {
                 "messages": [
-                    {"role": "human", "content": "What's the weather like in London today?"},
-                    {"role": "ai", "content": "The current weather in London is 12°C with light rain. Humidity is at 85% and wind speed is 10 km/h."}
-                ]
+                    {"role": "user", "content": "What's the weather like in London today?"},
+                    {"role": "assistant", "content": "The current weather in London is 12°C with light rain. Humidity is at 85% and wind speed is 10 km/h."}
+                ],
+                "next_cursor": "665f1c2e8b3f4a1d2c3b4a5e"
             }
         }
+    )
 
 class UserCreate(BaseModel):
     """Model for user creation requests"""
     username: str = Field(..., description="Username for the new account")
     password: str = Field(..., description="Password for the new account")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "username": "john_doe",
                 "password": "secure_password123"
             }
         }
+    )
 
 class UserResponse(BaseModel):
     """Model for user-related responses"""
     username: str = Field(..., description="Username of the affected account")
     message: str = Field(..., description="Status message")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "username": "john_doe",
                 "message": "User created successfully"
             }
         }
+    )
 
 class Token(BaseModel):
     """Model for authentication tokens"""
     access_token: str = Field(..., description="JWT access token")
     token_type: str = Field(..., description="Token type (always 'bearer')")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
                 "token_type": "bearer"
             }
         }
+    )
+
+# Upper bound on queries per batch request, to bound per-request memory and LLM fan-out
+MAX_BATCH_QUERIES = 20
+
+class BatchQueryRequest(BaseModel):
+    """Model for batched chat query requests"""
+    queries: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_QUERIES,
+        description=f"The user's queries to the weather agent (at most {MAX_BATCH_QUERIES})"
+    )
+    
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "queries": [
+                    "What's the weather like in London today?",
+                    "What's the forecast for Tokyo for the next 5 days?"
+                ]
+            }
+        }
+    )
+
+class BatchQueryResponse(BaseModel):
+    """Model for batched chat query responses"""
+    responses: List[str] = Field(..., description="The agent's responses, in the same order as the queries")
+    
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "example": {
+                "responses": [
+                    "The current weather in London is 12°C with light rain.",
+                    "Tokyo will be mostly sunny for the next 5 days with highs around 20°C."
+                ]
+            }
+        }
+    )
+
+class ChatQuery(msgspec.Struct):
+    """Decoded chat query body (hot path; QueryRequest documents the same schema)"""
+    query: str
+
+_chat_query_decoder = msgspec.json.Decoder(ChatQuery)
+
+# Largest chat query body accepted once gzip-encoded bodies are inflated
+MAX_CHAT_BODY_BYTES = 1024 * 1024
+_json_encoder = msgspec.json.Encoder()
+
+# Request body documentation for routes that decode ChatQuery themselves
+CHAT_QUERY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": QueryRequest.model_json_schema()}},
+    }
+}
+
+#
+# Errors raised with a fixed status and detail, built once
+#
+
+USERNAME_TAKEN = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Username already exists"
+)
+INVALID_LOGIN = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Incorrect username or password",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+NOT_ACCOUNT_OWNER = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="Not authorized to delete this user"
+)
+USER_NOT_FOUND = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="User not found"
+)
+INVALID_CURSOR = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Invalid after_id cursor"
+)
 
 #
 # Helper functions
 #
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def decode_chat_query(request: Request) -> ChatQuery:
     """
-    Dependency to get the current authenticated user from the token.
+    Dependency decoding the chat query body with msgspec.
+    
+    Bodies sent with `Content-Encoding: gzip` are inflated first, up to
+    MAX_CHAT_BODY_BYTES.
     
     Args:
-        token: The authentication token from the request
+        request: The incoming request
         
     Returns:
-        str: The username extracted from the token
+        ChatQuery: The decoded query
         
     Raises:
-        HTTPException: If the token is invalid or the user doesn't exist
+        HTTPException: If the body is not valid JSON or doesn't match the schema,
+            is badly or unsupportedly encoded, or inflates past the size limit
     """
-    if not user_manager.user_exists(token):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return token
+    body = await request.body()
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding == "gzip":
+        inflater = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        try:
+            body = inflater.decompress(body, MAX_CHAT_BODY_BYTES)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {str(e)}")
+        if inflater.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="Chat query body too large")
+    elif encoding != "identity":
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Unsupported content encoding: {encoding}")
+    
+    try:
+        return _chat_query_decoder.decode(body)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-def get_agent(user_id: str):
+def get_user_manager(request: Request) -> UserManager:
+    """
+    Dependency returning the shared user manager created at startup.
+    
+    Args:
+        request: The incoming request
+        
+    Returns:
+        UserManager: The application's user manager
+    """
+    return request.app.state.user_manager
+
+def create_access_token(username: str) -> str:
+    """
+    Create a signed JWT access token for a user.
+    
+    Args:
+        username: The username to embed as the token subject
+        
+    Returns:
+        str: The encoded JWT
+    """
+    expire = datetime.now(timezone.utc) + timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": username, "exp": expire}, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def get_prompt_cache(request: Request) -> PromptCache:
+    """
+    Dependency returning the prompt cache initialized at startup.
+    
+    Args:
+        request: The incoming request
+        
+    Returns:
+        PromptCache: The application's prompt cache
+    """
+    prompt_cache = getattr(request.app.state, "prompt_cache", None)
+    if prompt_cache is None:
+        # Startup initialization failed; PromptCache is a singleton, so this is cheap to retry
+        prompt_cache = request.app.state.prompt_cache = PromptCache()
+    return prompt_cache
+
+async def authenticate_token(token: str) -> Optional[str]:
+    """
+    Resolve a bearer token to a username.
+    
+    The token signature and expiry are verified locally. MongoDB is only
+    consulted to check that the user hasn't been deleted since the token
+    was issued, and that result is cached briefly.
+    
+    Args:
+        token: The bearer token from the Authorization header
+        
+    Returns:
+        Optional[str]: The username, or None if the token is invalid or the user doesn't exist
+    """
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        return None
+    
+    username = payload.get("sub")
+    if not username:
+        return None
+    
+    if username in auth_cache:
+        return username
+    
+    # user_exists is a blocking MongoDB query; keep it off the event loop
+    exists = await run_in_threadpool(app.state.user_manager.user_exists, username)
+    if not exists:
+        return None
+    auth_cache[username] = True
+    return username
+
+async def get_current_user(request: Request) -> str:
+    """
+    Dependency to get the current authenticated user.
+    
+    Authentication itself is done by CORSAuthMiddleware; this only reads the
+    user it stored on the request. Protected routes declare the OAuth2 scheme
+    in the OpenAPI docs through BEARER_AUTH_OPENAPI.
+    
+    Args:
+        request: The incoming request
+        
+    Returns:
+        str: The authenticated username
+    """
+    return request.scope["state"]["user"]
+
+#
+# Middleware
+#
+
+# Routes reachable without a bearer token
+PUBLIC_PATHS = {"/signup", "/token", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"}
+if ENABLE_TEST_ROUTES:
+    PUBLIC_PATHS.add("/run-test")
+
+# Allowed browser origins for CORS (comma-separated CORS_ORIGINS)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:8501,http://127.0.0.1:8501").split(",")
+    if origin.strip()
+]
+
+# CORS and authentication in one layer, so each request takes a single middleware pass
+app.add_middleware(
+    CORSAuthMiddleware,
+    authenticate=authenticate_token,
+    public_paths=PUBLIC_PATHS,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["authorization", "content-type"],
+)
+
+# Compress larger responses (chat history pages, batch replies) for clients that accept gzip;
+# Starlette 0.46+ leaves text/event-stream responses alone, so chat streams are not buffered
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+def _release_agent(entry):
+    """Release the resources held by an (agent, memory, config) cache entry."""
+    _, memory, _ = entry
+    try:
+        memory.close()
+    except Exception as e:
+        logger.warning("Error releasing agent memory: %s", str(e))
+
+class AgentCache(TTLCache):
+    """
+    TTL + LRU bounded cache of per-user agents.
+    
+    Entries that expire or are evicted to make room are released when they
+    leave the cache.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def popitem(self):
+        key, entry = super().popitem()
+        self.evictions += 1
+        _release_agent(entry)
+        return key, entry
+    
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, entry in expired:
+            self.evictions += 1
+            _release_agent(entry)
+        return expired
+    
+    def stats(self) -> Dict[str, int]:
+        """Return cache telemetry."""
+        return {
+            "size": len(self),
+            "maxsize": int(self.maxsize),
+            "ttl": int(self.ttl),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+# Cache for agent instances to avoid recreating them for each request
+agent_cache = AgentCache(maxsize=AGENT_CACHE_MAXSIZE, ttl=AGENT_CACHE_TTL)
+# In-flight agent constructions, keyed by user ID
+_agent_builds: Dict[str, asyncio.Task] = {}
+
+async def _build_agent(user_id: str):
+    """
+    Build an agent for the user in the threadpool and store it in the cache.
+    
+    Args:
+        user_id: The user ID to build an agent for
+        
+    Returns:
+        tuple: A tuple containing (agent, memory, config)
+    """
+    try:
+        agent, memory = await run_in_threadpool(create_weather_agent, user_id=user_id)
+        # The run config only depends on the user, so build it once with the agent
+        entry = (agent, memory, {"configurable": {"session_id": user_id}})
+        agent_cache[user_id] = entry
+        return entry
+    finally:
+        _agent_builds.pop(user_id, None)
+
+async def get_agent_executor():
+    """
+    Get the agent executor shared by all users.
+    
+    It is built in the threadpool when the day has changed (or after a prompt
+    update), so the first request of a day doesn't block the event loop.
+    
+    Returns:
+        AgentExecutor: The weather agent executor
+    """
+    return current_agent_executor() or await run_in_threadpool(build_agent_executor)
+
+async def get_agent(user_id: str):
     """
     Get or create an agent for the specified user_id.
     
+    Concurrent requests for a user without a cached agent share a single
+    construction task instead of each building (and discarding) their own.
+    A cached agent is rewrapped around the current shared executor once that
+    changes, e.g. after midnight, so it doesn't keep the previous day's prompt.
+    
     Args:
         user_id: The user ID to get or create an agent for
         
     Returns:
-        tuple: A tuple containing (agent, memory)
+        tuple: A tuple containing (agent, memory, config)
     """
-    if user_id not in agent_cache:
-        agent, memory = create_weather_agent(user_id=user_id)
-        agent_cache[user_id] = (agent, memory)
-    return agent_cache[user_id]
+    entry = agent_cache.get(user_id)
+    if entry is not None:
+        agent_cache.hits += 1
+        agent, memory, config = entry
+        # Returns the same wrapper unless the shared executor was rebuilt
+        current = memory.create_runnable_with_history(await get_agent_executor())
+        if current is not agent:
+            entry = (current, memory, config)
+            # Don't bring back an entry that was evicted while the executor was built
+            if user_id in agent_cache:
+                agent_cache[user_id] = entry
+        return entry
+    
+    # No await between the lookups and the store, so this is atomic on the event loop
+    task = _agent_builds.get(user_id)
+    if task is None:
+        agent_cache.misses += 1
+        task = asyncio.create_task(_build_agent(user_id))
+        _agent_builds[user_id] = task
+    
+    # Shield the shared build so one cancelled request doesn't fail the others
+    return await asyncio.shield(task)
+
+def evict_agent(user_id: str):
+    """
+    Remove a user's agent from the cache and release its resources.
+    
+    Args:
+        user_id: The user ID whose agent should be evicted
+        
+    Returns:
+        bool: True if an agent was cached for the user, False otherwise
+    """
+    entry = agent_cache.pop(user_id, None)
+    if entry is None:
+        return False
+    _release_agent(entry)
+    return True
 
 #
 # API Routes
@@ -220,7 +689,10 @@ def get_agent(user_id: str):
     summary="Create a new user account",
     status_code=status.HTTP_201_CREATED
 )
-async def create_user(user: UserCreate):
+async def create_user(
+    user: UserCreate,
+    user_manager: UserManager = Depends(get_user_manager)
+):
     """
     Create a new user account with the provided username and password.
     
@@ -231,16 +703,14 @@ async def create_user(user: UserCreate):
     
     Raises a 400 error if the username already exists.
     """
-    if user_manager.register_user(user.username, user.password):
+    # Password hashing and the insert are blocking; keep them off the event loop
+    if await run_in_threadpool(user_manager.register_user, user.username, user.password):
         return UserResponse(
             username=user.username,
             message="User created successfully"
         )
     else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already exists"
-        )
+        raise USERNAME_TAKEN
 
 @app.post(
     "/token", 
@@ -248,7 +718,10 @@ async def create_user(user: UserCreate):
     tags=["User Management"],
     summary="Login and get access token"
 )
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    user_manager: UserManager = Depends(get_user_manager)
+):
     """
     Authenticate a user and return an access token.
     
@@ -259,29 +732,27 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     
     Raises a 401 error if authentication fails.
     """
-    if user_manager.authenticate_user(form_data.username, form_data.password):
-        # In a real app, you would generate a JWT token
-        # For simplicity, we're using the username as the token
+    # Password hashing and the lookup are blocking; keep them off the event loop
+    if await run_in_threadpool(user_manager.authenticate_user, form_data.username, form_data.password):
         return Token(
-            access_token=form_data.username,
+            access_token=create_access_token(form_data.username),
             token_type="bearer"
         )
     else:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise INVALID_LOGIN
 
 @app.delete(
     "/users/{username}", 
     response_model=UserResponse,
     tags=["User Management"],
-    summary="Delete a user account"
+    summary="Delete a user account",
+    openapi_extra=BEARER_AUTH_OPENAPI
 )
 async def delete_user(
+    request: Request,
     username: str, 
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    user_manager: UserManager = Depends(get_user_manager)
 ):
     """
     Delete a user account (only if it's the current user).
@@ -296,44 +767,168 @@ async def delete_user(
     """
     # Only allow users to delete their own account
     if current_user != username:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to delete this user"
-        )
+        raise NOT_ACCOUNT_OWNER
     
-    if user_manager.delete_user(username):
-        # Also delete chat history
-        try:
-            # Get or create the agent for this user
-            _, memory = get_agent(username)
-            memory.clear_history()
-            
-            # Remove from cache
-            if username in agent_cache:
-                del agent_cache[username]
-        except Exception:
-            # Continue even if clearing history fails
-            pass
+    # The account and its chat history live in different collections, so the
+    # two deletes are issued concurrently rather than one after the other
+    deleted, history_result = await asyncio.gather(
+        run_in_threadpool(user_manager.delete_user, username),
+        run_in_threadpool(clear_session_history, username, request.app.state.mongo),
+        return_exceptions=True,
+    )
+    if isinstance(deleted, Exception):
+        raise deleted
+    
+    if deleted:
+        # Stop accepting the user's token on this worker right away
+        auth_cache.pop(username, None)
+        evict_agent(username)
+        
+        # Continue even if clearing history fails
+        if isinstance(history_result, Exception):
+            logger.warning("Error clearing chat history for deleted user '%s': %s", username, history_result)
             
         return UserResponse(
             username=username,
             message="User deleted successfully"
         )
     else:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+        raise USER_NOT_FOUND
 
 # Weather Agent Routes
+
+# Chat queries currently being processed, keyed by (user_id, query). Streamed
+# queries register a future that is resolved with the full answer.
+_chat_inflight: Dict[tuple, asyncio.Future] = {}
+
+# Very short-lived cache of final answers to absorb duplicate submissions
+CHAT_DEDUP_TTL = int(os.getenv("CHAT_DEDUP_TTL", "5"))
+recent_chat_responses = TTLCache(maxsize=1024, ttl=CHAT_DEDUP_TTL)
+
+# Answers to self-contained weather questions, shared across users for a short time.
+# They only come from runs without the asking user's history (see _invoke_agent).
+SHARED_RESPONSE_CACHE_TTL = int(os.getenv("SHARED_RESPONSE_CACHE_TTL", "60"))
+shared_responses = TTLCache(maxsize=1000, ttl=SHARED_RESPONSE_CACHE_TTL)
+
+# Queries that refer to the user or the conversation can't be answered from another user's turn
+_CONTEXTUAL_QUERY = re.compile(
+    r"\b(i|me|my|mine|we|us|our|you|your|it|its|that|this|those|these|there|same|again|"
+    r"earlier|before|previous|previously|last|above|said|mentioned|remember)\b",
+    re.IGNORECASE,
+)
+
+_WORD = re.compile(r"[\w']+")
+
+# Words that don't change what a weather question asks for
+_FILLER_WORDS = frozenset({
+    "a", "an", "the", "in", "for", "at", "of", "is", "are", "what", "what's", "whats", "how", "how's", "hows",
+    "please", "can", "could", "would", "tell", "show", "give", "like", "currently", "now",
+})
+
+def _shared_cache_key(query: str) -> Optional[str]:
+    """
+    Return the cross-user cache key for a query, or None if it must not be shared.
+    
+    The key is the query's words in order, without punctuation, case or filler
+    words, so "What's the weather in Paris?" and "weather in paris please" share
+    an answer, while questions about other places or days, or the same places
+    in another order ("Is Paris warmer than Rome?"), don't.
+    
+    Args:
+        query: The user's query
+        
+    Returns:
+        Optional[str]: The normalized query, or None for context-dependent queries
+    """
+    if _CONTEXTUAL_QUERY.search(query):
+        return None
+    return " ".join(w for w in _WORD.findall(query.lower()) if w not in _FILLER_WORDS) or None
+
+async def _invoke_agent(user_id: str, query: str) -> str:
+    """
+    Run a query through the user's agent and return the output text.
+    
+    Args:
+        user_id: The user ID whose agent should answer
+        query: The user's query
+        
+    Returns:
+        str: The agent's response
+    """
+    key = (user_id, query)
+    try:
+        # Get or create the agent for this user
+        agent, memory, config = await get_agent(user_id)
+        
+        # Someone asked the same self-contained question moments ago
+        shared_key = _shared_cache_key(query)
+        output = shared_responses.get(shared_key) if shared_key else None
+        if output is not None:
+            log_debug("Using shared cached response for user '%s'", user_id)
+            # Record the turn so the user's history still reads as a conversation
+            if needs_history(query):
+                await memory.aadd_exchange(query, output)
+            recent_chat_responses[key] = output
+            return output
+        
+        # Process the query without blocking the event loop
+        log_debug("Invoking agent for user '%s'", user_id)
+        if shared_key:
+            # Other users may get this answer, so it must not draw on this user's history
+            executor = await get_agent_executor()
+            response = await executor.ainvoke({"input": query, "chat_history": []})
+            if needs_history(query):
+                await memory.aadd_exchange(query, response["output"])
+            shared_responses[shared_key] = response["output"]
+        else:
+            response = await agent.ainvoke({"input": query}, config)
+        
+        log_info("Successfully processed query for user '%s'", user_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            log_debug("Agent response: '%s...'", response['output'][:100])
+        
+        recent_chat_responses[key] = response["output"]
+        return response["output"]
+    finally:
+        _chat_inflight.pop(key, None)
+
+async def _answer_query(user_id: str, query: str) -> str:
+    """
+    Answer a query, reusing a recent or in-flight answer to the same query.
+    
+    Args:
+        user_id: The user ID whose agent should answer
+        query: The user's query
+        
+    Returns:
+        str: The agent's response
+    """
+    key = (user_id, query)
+    
+    # Same query answered moments ago (e.g. a double-clicked send)
+    output = recent_chat_responses.get(key)
+    if output is not None:
+        log_debug("Returning recent response for user '%s'", user_id)
+        return output
+    
+    # Join an identical query that is already running instead of invoking the agent again
+    task = _chat_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_invoke_agent(user_id, query))
+        _chat_inflight[key] = task
+    else:
+        log_debug("Joining in-flight query for user '%s'", user_id)
+    return await asyncio.shield(task)
+
 @app.post(
     "/api/chat", 
     response_model=QueryResponse,
     tags=["Weather Agent"],
-    summary="Send a query to the weather agent"
+    summary="Send a query to the weather agent",
+    openapi_extra={**CHAT_QUERY_OPENAPI, **BEARER_AUTH_OPENAPI}
 )
 async def chat_agent(
-    request: QueryRequest,
+    request: ChatQuery = Depends(decode_chat_query),
     current_user: str = Depends(get_current_user)
 ):
     """
@@ -365,35 +960,214 @@ async def chat_agent(
         # Use the authenticated user's ID from the token
         user_id = current_user
         
-        logger.info(f"Processing chat query for user '{user_id}': '{request.query}'")
+        log_info("Processing chat query for user '%s': '%s'", user_id, request.query)
         
-        # Get or create the agent for this user
-        agent, _ = get_agent(user_id)
+        output = await _answer_query(user_id, request.query)
+        
+        return Response(_json_encoder.encode({"response": output}), media_type="application/json")
+    except Exception as e:
+        log_error("Error processing query for user '%s': %s", current_user, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+@app.post(
+    "/api/chat/batch",
+    response_model=BatchQueryResponse,
+    tags=["Weather Agent"],
+    summary="Send several queries to the weather agent in one request",
+    openapi_extra=BEARER_AUTH_OPENAPI
+)
+async def chat_agent_batch(
+    request: BatchQueryRequest,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Send several queries to the weather agent and get all responses at once.
+    
+    The queries are answered concurrently, all against the conversation history
+    as it was when the batch arrived, and the responses are returned in the
+    same order as the queries. The exchanges are then added to the history in
+    that order. At most 20 queries are accepted per request.
+    
+    Args:
+        request: The batch request containing the user's questions
+        current_user: The authenticated user (automatically provided by the dependency)
+    
+    Returns:
+        BatchQueryResponse containing one response per query
+    
+    Raises:
+        HTTPException: If there's an error processing any of the queries
+    
+    Requires authentication. The authenticated user's ID is used to maintain conversation context.
+    """
+    try:
+        user_id = current_user
+        logger.info("Processing batch of %s queries for user '%s'", len(request.queries), user_id)
+        
+        _, memory, _ = await get_agent(user_id)
+        executor = await get_agent_executor()
         
-        # Create config with session_id
-        config = {"configurable": {"session_id": user_id}}
+        # Read the history once; every query is answered against this snapshot, so
+        # the concurrent runs don't race each other's reads and writes
+        queries = request.queries
+        uses_history = [needs_history(query) for query in queries]
+        history = await memory.aget_context() if any(uses_history) else []
         
-        # Process the query
-        logger.debug(f"Invoking agent for user '{user_id}'")
-        response = agent.invoke({"input": request.query}, config)
+        async def answer(query, with_history):
+            response = await executor.ainvoke({"input": query, "chat_history": history if with_history else []})
+            return response["output"]
         
-        logger.info(f"Successfully processed query for user '{user_id}'")
-        logger.debug(f"Agent response: '{response['output'][:100]}...'")
+        responses = await asyncio.gather(*map(answer, queries, uses_history))
         
-        return QueryResponse(response=response["output"])
+        # One write, in batch order; small talk isn't stored, as in /api/chat
+        exchanges = [pair for pair, stored in zip(zip(queries, responses), uses_history) if stored]
+        if exchanges:
+            await memory.aadd_exchanges(exchanges)
+        return BatchQueryResponse(responses=responses)
     except Exception as e:
-        logger.error(f"Error processing query for user '{current_user}': {str(e)}", exc_info=True)
+        logger.error("Error processing batch for user '%s': %s", current_user, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+async def _replay_answer(output: str):
+    """Send a complete answer as a Server-Sent Events stream with a single text event."""
+    yield f"data: {json.dumps(output)}\n\n"
+    yield "data: [DONE]\n\n"
+
+def _fail_answer(answer: asyncio.Future, error: Exception):
+    """Fail an in-flight answer that hasn't been resolved yet."""
+    if not answer.done():
+        answer.set_exception(error)
+        # Nobody may be waiting on it; don't log the error again as never retrieved
+        answer.exception()
+
+@app.post(
+    "/api/chat/stream",
+    tags=["Weather Agent"],
+    summary="Send a query to the weather agent and stream the response",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+    openapi_extra={**CHAT_QUERY_OPENAPI, **BEARER_AUTH_OPENAPI}
+)
+async def chat_agent_stream(
+    request: ChatQuery = Depends(decode_chat_query),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Send a query to the weather agent and stream the response as it is generated.
+    
+    The response is a Server-Sent Events stream. Each event carries a JSON-encoded
+    text fragment (`data: "..."`), and the stream ends with `data: [DONE]`. If the
+    agent fails mid-stream, an `error` event with a JSON `detail` is sent before
+    the stream is closed.
+    
+    Queries go through the same caches as /api/chat: an answer given moments ago,
+    one still being generated for an identical request, or a shared answer to a
+    self-contained question is replayed as a single event instead of running the
+    agent again.
+    
+    Args:
+        request: The query request containing the user's question
+        current_user: The authenticated user (automatically provided by the dependency)
+    
+    Returns:
+        StreamingResponse with media type text/event-stream
+    
+    Requires authentication. The authenticated user's ID is used to maintain conversation context.
+    """
+    user_id = current_user
+    query = request.query
+    logger.info("Processing streaming chat query for user '%s': '%s'", user_id, query)
+    
+    key = (user_id, query)
+    shared_key = _shared_cache_key(query)
+    
+    # A recent, in-flight or shared answer is replayed as a single event
+    if key in recent_chat_responses or key in _chat_inflight or (shared_key and shared_key in shared_responses):
+        try:
+            output = await _answer_query(user_id, query)
+        except Exception as e:
+            logger.error("Error processing query for user '%s': %s", user_id, e, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+        return StreamingResponse(
+            _replay_answer(output),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    
+    try:
+        agent, memory, config = await get_agent(user_id)
+        if shared_key:
+            # Other users may get this answer, so it must not draw on this user's history
+            executor = await get_agent_executor()
+            events = executor.astream_events({"input": query, "chat_history": []}, version="v2")
+        else:
+            events = agent.astream_events({"input": query}, config, version="v2")
+    except Exception as e:
+        logger.error("Error creating agent for user '%s': %s", user_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    
+    async def event_stream():
+        # Identical queries sent while this one streams wait for its answer instead of
+        # running again. Registered here so the finally below always unregisters it.
+        answer = asyncio.get_running_loop().create_future()
+        _chat_inflight.setdefault(key, answer)
+        parts = []
+        output = None
+        try:
+            async for event in events:
+                if event["event"] == "on_chain_end" and not event["parent_ids"]:
+                    # The run's final answer, without any text streamed before a tool call
+                    final = event["data"].get("output")
+                    if isinstance(final, dict) and isinstance(final.get("output"), str):
+                        output = final["output"]
+                    continue
+                if event["event"] != "on_chat_model_stream":
+                    continue
+                # Tool-call chunks carry no text content; skip them
+                content = event["data"]["chunk"].content
+                if content and isinstance(content, str):
+                    parts.append(content)
+                    yield f"data: {json.dumps(content)}\n\n"
+            
+            if output is None:
+                output = "".join(parts)
+            if shared_key:
+                if needs_history(query):
+                    await memory.aadd_exchange(query, output)
+                shared_responses[shared_key] = output
+            recent_chat_responses[key] = output
+            answer.set_result(output)
+            
+            yield "data: [DONE]\n\n"
+            logger.info("Successfully streamed response for user '%s'", user_id)
+        except Exception as e:
+            _fail_answer(answer, e)
+            logger.error("Error streaming query for user '%s': %s", user_id, e, exc_info=True)
+            yield f"event: error\ndata: {json.dumps({'detail': f'Error processing query: {str(e)}'})}\n\n"
+        finally:
+            if _chat_inflight.get(key) is answer:
+                del _chat_inflight[key]
+            # The client went away mid-stream; don't leave joined requests waiting
+            _fail_answer(answer, RuntimeError("Streaming response was interrupted"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Chat History Routes
 @app.get(
     "/chat-history", 
     response_model=ChatHistoryResponse,
     tags=["Chat History"],
-    summary="Get chat history for the current user"
+    summary="Get chat history for the current user",
+    openapi_extra=BEARER_AUTH_OPENAPI
 )
 async def get_chat_history(
+    request: Request,
     limit: int = Query(50, description="Maximum number of messages to return"),
+    after_id: Optional[str] = Query(None, description="Cursor from a previous response; only return messages after it"),
     current_user: str = Depends(get_current_user)
 ):
     """
@@ -402,52 +1176,67 @@ async def get_chat_history(
     This endpoint retrieves the conversation history between the user and the weather agent.
     The history is stored in the MongoDB database and is specific to each user.
     
+    Without `after_id` the most recent messages are returned. To page forward,
+    pass the `next_cursor` of a response as `after_id`; the next messages are
+    then read from the index starting at that cursor rather than skipped over.
+    
+    Responses carry an `ETag`. Sending it back in `If-None-Match` gets an empty
+    304 response when the page has not changed since.
+    
     Args:
+        request: The incoming request, read for its If-None-Match header
         limit: Maximum number of messages to return (defaults to 50)
+        after_id: Cursor from a previous response's next_cursor
         current_user: The authenticated user (automatically provided by the dependency)
     
     Returns:
-        ChatHistoryResponse containing a list of chat messages with role and content
+        ChatHistoryResponse containing a list of chat messages with role and content,
+        and the cursor for the next page
     
     Raises:
-        HTTPException: If there's an error retrieving the chat history
+        HTTPException: If after_id is not a valid cursor, or there's an error retrieving the chat history
     
     Requires authentication.
     """
+    if after_id is not None and not ObjectId.is_valid(after_id):
+        raise INVALID_CURSOR
+    
     try:
-        logger.info(f"Retrieving chat history for user '{current_user}' with limit {limit}")
+        log_info("Retrieving chat history for user '%s' with limit %s", current_user, limit)
         
         # Get or create the agent for this user
-        _, memory = get_agent(current_user)
+        _, memory, _ = await get_agent(current_user)
         
-        # Get chat history directly from the memory handler
-        chat_history = memory.get_chat_history()
+        # Fetch only the requested page of messages from MongoDB, as plain pairs
+        chat_history, next_cursor = await memory.aget_history_page(limit, after_id)
         
-        logger.debug(f"Retrieved {len(chat_history)} messages from history for user '{current_user}'")
+        log_debug("Retrieved %s messages from history for user '%s'", len(chat_history), current_user)
         
         # Format messages for response
-        messages = [
-            {
-                "role": "user" if msg.type == "human" else "assistant",
-                "content": msg.content
-            } 
-            for msg in chat_history
+        role = MESSAGE_ROLES.get
+        messages: List[ChatMessage] = [
+            {"role": role(msg_type, "assistant"), "content": content}
+            for msg_type, content in chat_history
         ]
         
-        # Apply limit if specified
-        if limit and limit > 0:
-            messages = messages[-limit:]
-            logger.debug(f"Applied limit, returning {len(messages)} messages")
+        # The shape is fixed, so skip re-validating it through ChatHistoryResponse
+        body = orjson.dumps({"messages": messages, "next_cursor": next_cursor})
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
         
-        return ChatHistoryResponse(messages=messages)
+        # Clients that already hold this page only need to hear that it's unchanged
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
     except Exception as e:
-        logger.error(f"Error retrieving chat history for user '{current_user}': {str(e)}", exc_info=True)
+        log_error("Error retrieving chat history for user '%s': %s", current_user, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error retrieving chat history: {str(e)}")
 
 @app.delete(
     "/chat-history",
     tags=["Chat History"],
-    summary="Delete chat history for the current user"
+    summary="Delete chat history for the current user",
+    openapi_extra=BEARER_AUTH_OPENAPI
 )
 async def delete_chat_history(current_user: str = Depends(get_current_user)):
     """
@@ -468,68 +1257,86 @@ async def delete_chat_history(current_user: str = Depends(get_current_user)):
     Requires authentication.
     """
     try:
-        logger.info(f"Deleting chat history for user '{current_user}'")
+        log_info("Deleting chat history for user '%s'", current_user)
         
         # Get or create the agent for this user
-        _, memory = get_agent(current_user)
+        _, memory, _ = await get_agent(current_user)
         
         # Clear chat history
-        memory.clear_history()
-        logger.debug(f"Chat history cleared for user '{current_user}'")
+        await memory.aclear_history()
+        log_debug("Chat history cleared for user '%s'", current_user)
         
         # Remove from cache to force recreation on next request
-        if current_user in agent_cache:
-            del agent_cache[current_user]
-            logger.debug(f"Removed agent from cache for user '{current_user}'")
+        if evict_agent(current_user):
+            log_debug("Removed agent from cache for user '%s'", current_user)
         
-        logger.info(f"Successfully deleted chat history for user '{current_user}'")
+        log_info("Successfully deleted chat history for user '%s'", current_user)
         return {"status": "success", "message": f"Chat history deleted for user {current_user}"}
     except Exception as e:
-        logger.error(f"Error deleting chat history for user '{current_user}': {str(e)}", exc_info=True)
+        log_error("Error deleting chat history for user '%s': %s", current_user, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error deleting chat history: {str(e)}")
 
-# Testing Routes
-@app.post(
-    "/run-test",
-    tags=["Testing"],
-    summary="Run the test_memory script",
+# Internal Routes
+@app.get(
+    "/internal/agent-cache",
+    tags=["Internal"],
+    summary="Agent cache statistics",
     include_in_schema=False  # Hide from documentation
 )
-async def run_test_memory():
+async def agent_cache_stats(current_user: str = Depends(get_current_user)):
     """
-    Run the test_memory script for testing purposes.
-    
-    This endpoint is for development and testing only. It runs the test_conversation_memory
-    function from the test_memory module to verify that the conversation memory is working correctly.
+    Return telemetry for the per-user agent cache.
     
-    Returns:
-        A dictionary with status and message indicating successful test completion
-    
-    Raises:
-        HTTPException: If there's an error running the test
+    Requires authentication.
     """
-    try:
-        logger.info("Running test_memory script")
+    return agent_cache.stats()
+
+# Testing Routes (only registered when ENABLE_TEST_ROUTES is set)
+if ENABLE_TEST_ROUTES:
+    @app.post(
+        "/run-test",
+        tags=["Testing"],
+        summary="Run the test_memory script",
+        include_in_schema=False  # Hide from documentation
+    )
+    async def run_test_memory():
+        """
+        Run the test_memory script for testing purposes.
         
-        from test_memory import test_conversation_memory
+        This endpoint is for development and testing only and is only registered when
+        ENABLE_TEST_ROUTES is set. It runs the test_conversation_memory function from the
+        test_memory module to verify that the conversation memory is working correctly.
         
-        # Run the test
-        logger.debug("Executing test_conversation_memory function")
-        test_conversation_memory()
+        Returns:
+            A dictionary with status and message indicating successful test completion
         
-        logger.info("Test completed successfully")
-        return {"status": "success", "message": "Test completed successfully"}
-    except Exception as e:
-        logger.error(f"Error running test: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error running test: {str(e)}")
+        Raises:
+            HTTPException: If there's an error running the test
+        """
+        try:
+            logger.info("Running test_memory script")
+            
+            # Run the test
+            logger.debug("Executing test_conversation_memory function")
+            await run_in_threadpool(test_conversation_memory)
+            
+            logger.info("Test completed successfully")
+            return {"status": "success", "message": "Test completed successfully"}
+        except Exception as e:
+            logger.error("Error running test: %s", e, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Error running test: {str(e)}")
 
 # Prompt Management Endpoints
 @app.get(
     "/prompts", 
     tags=["Prompt Management"],
-    summary="List all prompts in the cache"
+    summary="List all prompts in the cache",
+    openapi_extra=BEARER_AUTH_OPENAPI
 )
-async def list_prompts(current_user: str = Depends(get_current_user)):
+async def list_prompts(
+    current_user: str = Depends(get_current_user),
+    prompt_cache: PromptCache = Depends(get_prompt_cache)
+):
     """
     List all prompts in the cache and their details.
     
@@ -538,7 +1345,6 @@ async def list_prompts(current_user: str = Depends(get_current_user)):
     Requires authentication.
     """
     try:
-        prompt_cache = PromptCache()
         prompts = prompt_cache.get_all_prompts()
         return {
             "status": "success",
@@ -559,17 +1365,16 @@ async def list_prompts(current_user: str = Depends(get_current_user)):
             }
         )
 
-@app.get(
-    "/prompts/{prompt_id}", 
-    tags=["Prompt Management"],
-    summary="Get details of a specific prompt"
-)
 @app.post(
     "/prompts/update-all", 
     tags=["Prompt Management"],
-    summary="Update all prompts in the cache"
+    summary="Update all prompts in the cache",
+    openapi_extra=BEARER_AUTH_OPENAPI
 )
-async def update_all_prompts(current_user: str = Depends(get_current_user)):
+async def update_all_prompts(
+    current_user: str = Depends(get_current_user),
+    prompt_cache: PromptCache = Depends(get_prompt_cache)
+):
     """
     Update all prompts in the cache by pulling the latest versions from LangChain Hub.
     
@@ -580,10 +1385,11 @@ async def update_all_prompts(current_user: str = Depends(get_current_user)):
     Requires authentication.
     """
     try:
-        prompt_cache = PromptCache()
+        # Update all prompts (each is a blocking LangChain Hub pull)
+        results = await run_in_threadpool(prompt_cache.update_all_prompts)
         
-        # Update all prompts
-        results = prompt_cache.update_all_prompts()
+        # New agents should pick up the refreshed prompt
+        reset_agent_components()
         
         # Count successes and failures
         success_count = sum(1 for success in results.values() if success)
@@ -611,6 +1417,62 @@ async def update_all_prompts(current_user: str = Depends(get_current_user)):
             }
         )
 
+@app.get(
+    "/prompts/{prompt_id}", 
+    tags=["Prompt Management"],
+    summary="Get details of a specific prompt",
+    openapi_extra=BEARER_AUTH_OPENAPI
+)
+async def get_prompt_details(
+    prompt_id: str = Path(..., description="ID of the prompt to look up"),
+    current_user: str = Depends(get_current_user),
+    prompt_cache: PromptCache = Depends(get_prompt_cache)
+):
+    """
+    Get the details of a single prompt in the cache.
+    
+    Returns a dictionary containing the prompt's template, input variables and type.
+    
+    Raises a 404 error if the prompt is not in the cache.
+    
+    Requires authentication.
+    """
+    prompts = prompt_cache.get_all_prompts()
+    if prompt_id not in prompts:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "status": "error",
+                "message": f"Prompt '{prompt_id}' not found"
+            }
+        )
+    
+    return {
+        "status": "success",
+        "message": f"Found prompt {prompt_id}",
+        "data": {
+            "prompt_id": prompt_id,
+            **prompts[prompt_id]
+        }
+    }
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    
+    workers = int(os.getenv("UVICORN_WORKERS", str(os.cpu_count() or 1)))
+    if workers > 1 and not os.getenv("JWT_SECRET_KEY"):
+        # Each worker would generate its own random key and reject the others' tokens
+        logger.warning("JWT_SECRET_KEY not set; running a single worker")
+        workers = 1
+    
+    # Multiple workers need the app as an import string; "auto" picks uvloop/httptools when installed
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        limit_concurrency=int(os.getenv("UVICORN_LIMIT_CONCURRENCY", "1000")),
+        timeout_keep_alive=30,
+    )
@@ -1,12 +1,365 @@
 import os
+import re
+import json
+import asyncio
+import functools
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient, WriteConcern
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict, messages_from_dict
 from langchain_mongodb.chat_message_histories import MongoDBChatMessageHistory
 from langchain.memory import ConversationBufferWindowMemory
+from langchain_core.runnables import RunnableBranch, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from logger_config import setup_logger
 
 # Set up logger
 logger = setup_logger(__name__)
 
+# Append chat messages without waiting for MongoDB to acknowledge them (opt-in:
+# faster turns, but a failed write is silently lost)
+UNACKNOWLEDGED_HISTORY_WRITES = os.getenv("CHAT_HISTORY_UNACKNOWLEDGED_WRITES", "").lower() in ("1", "true", "yes")
+
+# Pleasantries that need no conversation context to answer and add none to it.
+# Only whole messages match, so short follow-ups like "and tomorrow?" keep their history.
+SMALL_TALK_RE = re.compile(
+    r"^\s*(hi|hello|hey|thanks|thank you|thank you so much|thx|ok|okay|cool|great|nice|"
+    r"bye|goodbye|see you|good (morning|afternoon|evening|night))( there)?[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+
+def needs_history(text: str) -> bool:
+    """
+    Decide whether a user message should be answered with its conversation history.
+    
+    Args:
+        text (str): The user's message
+        
+    Returns:
+        bool: False for greetings, thanks and similar small talk, True otherwise
+    """
+    return not SMALL_TALK_RE.match(text)
+
+# (database, collection) pairs whose chat-history indexes exist already
+_indexed_collections = set()
+
+# Sync MongoDB client set by the application, shared by all chat histories
+_client = None
+
+# Async MongoDB client used by chat histories created from now on, if any
+_async_client = None
+
+def set_client(client):
+    """
+    Use an existing MongoDB client for all chat histories created from now on.
+    
+    Args:
+        client (MongoClient): The client to share, or None to fall back to one client per connection string
+    """
+    global _client
+    _client = client
+
+def mongo_pool_options() -> dict:
+    """
+    Connection pool settings for MongoDB clients, from environment variables.
+    
+    A warm floor of connections avoids handshakes on bursts, idle ones are
+    recycled after a while, and a request waiting on a saturated pool fails
+    fast instead of queueing indefinitely.
+    
+    Returns:
+        dict: Keyword arguments for MongoClient / AsyncMongoClient
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+        "retryWrites": True,
+    }
+
+@functools.lru_cache(maxsize=None)
+def get_shared_client(connection_string: str) -> MongoClient:
+    """
+    Get the process-wide MongoDB client for a connection string.
+    
+    MongoClient is thread-safe and pools connections itself, so one client
+    per URI is shared by every conversation memory.
+    
+    Args:
+        connection_string (str): MongoDB connection string
+        
+    Returns:
+        MongoClient: The shared client
+    """
+    logger.debug("Creating shared MongoDB client for chat history")
+    return MongoClient(connection_string, **mongo_pool_options())
+
+def set_async_client(client):
+    """
+    Use an async MongoDB client for chat-history reads and writes made from async code.
+    
+    Args:
+        client (AsyncMongoClient): The client to use, or None to fall back to the sync client in a thread
+    """
+    global _async_client
+    _async_client = client
+
+def ensure_history_indexes(collection):
+    """
+    Create the chat-history index on a collection once per process.
+    
+    The (SessionId asc, _id desc) compound index serves both the equality
+    match on the session and the newest-first sort, so loading the last k
+    messages is an index scan of k entries. Its prefix also covers plain
+    SessionId lookups, so the driver's single-field index isn't needed.
+    
+    Args:
+        collection (Collection): The chat-history collection
+    """
+    key = (collection.database.name, collection.name)
+    if key in _indexed_collections:
+        return
+    logger.debug("Creating chat history index on %s.%s", key[0], key[1])
+    collection.create_index([("SessionId", ASCENDING), ("_id", DESCENDING)])
+    _indexed_collections.add(key)
+
+def clear_session_history(
+    session_id: str,
+    client,
+    database_name: str = None,
+    collection_name: str = None,
+):
+    """
+    Clear the stored chat history for a session without building a full memory.
+    
+    Args:
+        session_id (str): The session (user) ID whose history should be cleared
+        client (MongoClient): An existing MongoDB client to run the delete on
+        database_name (str, optional): MongoDB database name
+        collection_name (str, optional): MongoDB collection name
+    """
+    logger.info("Clearing chat history for session %s", session_id)
+    history = MongoDBChatMessageHistory(
+        connection_string=None,
+        session_id=session_id,
+        database_name=database_name or os.getenv("MONGO_DB"),
+        collection_name=collection_name or os.getenv("MONGO_COLLECTION"),
+        client=client,
+        create_index=False,
+    )
+    history.clear()
+
+def compact_message_dict(message):
+    """
+    Serialize a message like `message_to_dict`, leaving out empty fields.
+    
+    A plain chat message's dict is mostly defaults (empty kwargs and
+    metadata, null name and id, no tool calls). Those are restored when the
+    message is loaded with `messages_from_dict`, so they needn't be stored.
+    
+    Args:
+        message (BaseMessage): The message to serialize
+        
+    Returns:
+        dict: {"type": ..., "data": {...}} with "content" and any non-empty fields
+    """
+    data = message_to_dict(message)["data"]
+    return {
+        "type": message.type,
+        "data": {
+            key: value for key, value in data.items()
+            if key == "content" or (value and key != "type")
+        },
+    }
+
+class WindowedMongoDBChatMessageHistory(MongoDBChatMessageHistory):
+    """
+    MongoDB chat history that only loads the most recent messages.
+    
+    `messages` is what RunnableWithMessageHistory injects into the prompt on
+    every turn. The base class loads the whole session for it; here the
+    window is applied in the query (newest first, limited) and reversed in
+    Python, so each turn reads at most `window` documents.
+    
+    Given an async collection, the async methods (used by `ainvoke`) talk to
+    MongoDB directly instead of running the sync driver in a worker thread.
+    """
+
+    def __init__(
+        self,
+        *args,
+        window: int = 0,
+        async_collection=None,
+        unacknowledged_writes: bool = False,
+        **kwargs,
+    ):
+        """
+        Initialize the chat history.
+        
+        Args:
+            window (int, optional): Number of most recent messages returned by
+                `messages`; all messages if not positive
+            async_collection (AsyncCollection, optional): The same collection
+                opened through an async MongoDB client
+            unacknowledged_writes (bool, optional): Append messages with w=0,
+                without waiting for the server to acknowledge them
+            *args, **kwargs: Passed through to MongoDBChatMessageHistory
+        """
+        super().__init__(*args, **kwargs)
+        self.window = window
+        self.async_collection = async_collection
+        
+        # Inserts go through these; reads and deletes keep the default write concern
+        self.write_collection = self.collection
+        self.async_write_collection = async_collection
+        if unacknowledged_writes:
+            fire_and_forget = WriteConcern(w=0)
+            self.write_collection = self.collection.with_options(write_concern=fire_and_forget)
+            if async_collection is not None:
+                self.async_write_collection = async_collection.with_options(write_concern=fire_and_forget)
+
+    def _query(self):
+        """Return the filter and projection used to read this session's messages."""
+        # Only the serialized message is needed; don't ship the rest of the document
+        return {self.session_id_key: self.session_id}, {self.history_key: 1, "_id": 0}
+
+    def _documents(self, messages):
+        """Serialize messages into documents MongoDBChatMessageHistory can read back."""
+        return [
+            {
+                self.session_id_key: self.session_id,
+                self.history_key: json.dumps(compact_message_dict(message)),
+            }
+            for message in messages
+        ]
+
+    def add_messages(self, messages):
+        """Append the messages to MongoDB in a single round-trip."""
+        documents = self._documents(messages)
+        if documents:
+            self.write_collection.insert_many(documents)
+
+    async def aget_messages(self):
+        """Retrieve the most recent messages from MongoDB, oldest first."""
+        return messages_from_dict(await self.arecent_items(self.window))
+
+    async def aadd_messages(self, messages):
+        """Append the messages to MongoDB in a single round-trip."""
+        if self.async_collection is None:
+            return await super().aadd_messages(messages)
+        documents = self._documents(messages)
+        if documents:
+            await self.async_write_collection.insert_many(documents)
+
+    async def aclear(self):
+        """Clear this session's messages from MongoDB."""
+        if self.async_collection is None:
+            return await super().aclear()
+        await self.async_collection.delete_many({self.session_id_key: self.session_id})
+
+    @property
+    def messages(self):
+        """Retrieve the most recent messages from MongoDB, oldest first."""
+        return messages_from_dict(self.recent_items(self.window))
+
+    def recent_items(self, n: int):
+        """
+        Load the stored message dicts for this session, oldest first.
+        
+        Args:
+            n (int): Maximum number of messages to load; all messages if not positive
+            
+        Returns:
+            list: Serialized messages as stored by MongoDBChatMessageHistory
+        """
+        cursor = self.collection.find(*self._query())
+        if not n or n <= 0:
+            cursor = cursor.sort("_id", ASCENDING)
+            return [json.loads(document[self.history_key]) for document in cursor]
+        
+        cursor = cursor.sort("_id", DESCENDING).limit(n)
+        items = [json.loads(document[self.history_key]) for document in cursor]
+        items.reverse()
+        return items
+
+    def _page_cursor(self, collection, n: int, after_id=None):
+        """
+        Build the cursor for one page of this session's messages.
+        
+        Without `after_id` the page is the most recent `n` messages (newest
+        first, to be reversed); with it, the first `n` messages stored after
+        that message, which is a plain index range scan however long the
+        conversation is.
+        """
+        query = {self.session_id_key: self.session_id}
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        cursor = collection.find(query, {self.history_key: 1})
+        if after_id is not None or not n or n <= 0:
+            cursor = cursor.sort("_id", ASCENDING)
+            return (cursor.limit(n) if n and n > 0 else cursor), False
+        return cursor.sort("_id", DESCENDING).limit(n), True
+
+    def page(self, n: int, after_id=None):
+        """
+        Load a page of stored messages for this session, oldest first.
+        
+        Args:
+            n (int): Maximum number of messages to load; all messages if not positive
+            after_id (ObjectId, optional): Only load messages stored after this one
+            
+        Returns:
+            list: (document ID, serialized message) pairs
+        """
+        cursor, newest_first = self._page_cursor(self.collection, n, after_id)
+        items = [(document["_id"], json.loads(document[self.history_key])) for document in cursor]
+        if newest_first:
+            items.reverse()
+        return items
+
+    async def apage(self, n: int, after_id=None):
+        """
+        Async version of `page`.
+        
+        Args:
+            n (int): Maximum number of messages to load; all messages if not positive
+            after_id (ObjectId, optional): Only load messages stored after this one
+            
+        Returns:
+            list: (document ID, serialized message) pairs
+        """
+        if self.async_collection is None:
+            return await asyncio.to_thread(self.page, n, after_id)
+        
+        cursor, newest_first = self._page_cursor(self.async_collection, n, after_id)
+        items = [(document["_id"], json.loads(document[self.history_key])) async for document in cursor]
+        if newest_first:
+            items.reverse()
+        return items
+
+    async def arecent_items(self, n: int):
+        """
+        Async version of `recent_items`.
+        
+        Args:
+            n (int): Maximum number of messages to load; all messages if not positive
+            
+        Returns:
+            list: Serialized messages as stored by MongoDBChatMessageHistory
+        """
+        if self.async_collection is None:
+            return await asyncio.to_thread(self.recent_items, n)
+        
+        cursor = self.async_collection.find(*self._query())
+        if not n or n <= 0:
+            cursor = cursor.sort("_id", ASCENDING)
+            return [json.loads(document[self.history_key]) async for document in cursor]
+        
+        cursor = cursor.sort("_id", DESCENDING).limit(n)
+        items = [json.loads(document[self.history_key]) async for document in cursor]
+        items.reverse()
+        return items
+
 class MongoDBConversationMemory:
     """
     Chat Memory with MongoDB for LangChain Agents, integrating:
@@ -36,24 +389,27 @@ class MongoDBConversationMemory:
         self.user_id = user_id
         self.k = k  # Number of past messages to remember
         
-        # Use provided connection details or fall back to environment variables
-        connection_string = connection_string or os.getenv("MONGO_URI")
-        database_name = database_name or os.getenv("MONGO_DB")
-        collection_name = collection_name or os.getenv("MONGO_COLLECTION")
+        # Use provided connection details or fall back to the shared client / environment variables
+        if connection_string:
+            self.client = get_shared_client(connection_string)
+        elif _client is not None:
+            self.client = _client
+        elif os.getenv("MONGO_URI"):
+            self.client = get_shared_client(os.getenv("MONGO_URI"))
+        else:
+            self.client = None
+        self.database_name = database_name or os.getenv("MONGO_DB")
+        self.collection_name = collection_name or os.getenv("MONGO_COLLECTION")
         
-        if not connection_string or not database_name or not collection_name:
+        if self.client is None or not self.database_name or not self.collection_name:
             logger.error("Missing MongoDB connection details")
             raise ValueError("MongoDB connection details are required")
         
-        logger.debug(f"Initializing MongoDB conversation memory for user {user_id}")
+        logger.debug("Initializing MongoDB conversation memory for user %s", user_id)
         
-        # Initialize MongoDB chat history
-        self.message_history = MongoDBChatMessageHistory(
-            connection_string=connection_string,
-            database_name=database_name,
-            collection_name=collection_name,
-            session_id=user_id
-        )
+        # Initialize MongoDB chat history, loading only the last k exchanges per turn
+        self.message_history = self._create_history(user_id)
+        ensure_history_indexes(self.message_history.collection)
         
         # Initialize conversation memory
         self.memory = ConversationBufferWindowMemory(
@@ -62,7 +418,11 @@ class MongoDBConversationMemory:
             k=k
         )
         
-        logger.info(f"MongoDB conversation memory initialized for user {user_id}")
+        # Wrapped runnable from create_runnable_with_history, and the runnable it wraps
+        self._wrapped = None
+        self._wrapped_for = None
+        
+        logger.info("MongoDB conversation memory initialized for user %s", user_id)
 
     def get_chat_history(self):
         """
@@ -71,8 +431,117 @@ class MongoDBConversationMemory:
         Returns:
             list: List of chat messages
         """
-        logger.debug(f"Getting chat history for user {self.user_id}")
-        return self.message_history.messages
+        logger.debug("Getting chat history for user %s", self.user_id)
+        return messages_from_dict(self.message_history.recent_items(0))
+
+    async def aget_chat_history(self):
+        """
+        Async version of `get_chat_history`.
+        
+        Returns:
+            list: List of chat messages
+        """
+        logger.debug("Getting chat history for user %s", self.user_id)
+        return messages_from_dict(await self.message_history.arecent_items(0))
+
+    async def aget_recent(self, n: int):
+        """
+        Async version of `get_recent`.
+        
+        Args:
+            n (int): Maximum number of messages to return; all messages if not positive
+            
+        Returns:
+            list: List of chat messages, oldest first
+        """
+        logger.debug("Getting %s most recent messages for user %s", n, self.user_id)
+        return messages_from_dict(await self.message_history.arecent_items(n))
+
+    def get_recent(self, n: int):
+        """
+        Get the most recent messages for the current user.
+        
+        The limit is applied in the MongoDB query rather than by loading the
+        whole conversation and slicing it.
+        
+        Args:
+            n (int): Maximum number of messages to return; all messages if not positive
+            
+        Returns:
+            list: List of chat messages, oldest first
+        """
+        logger.debug("Getting %s most recent messages for user %s", n, self.user_id)
+        return messages_from_dict(self.message_history.recent_items(n))
+
+    def get_recent_raw(self, n: int):
+        """
+        Get the most recent messages as plain (type, content) pairs.
+        
+        This skips building LangChain message objects, for callers that only
+        need to serialize the history.
+        
+        Args:
+            n (int): Maximum number of messages to return; all messages if not positive
+            
+        Returns:
+            list: List of (type, content) tuples, oldest first
+        """
+        logger.debug("Getting %s most recent raw messages for user %s", n, self.user_id)
+        return [(item["type"], item["data"]["content"]) for item in self.message_history.recent_items(n)]
+
+    async def aget_context(self):
+        """
+        Get the messages a turn is answered with: the most recent `k` exchanges.
+        
+        Returns:
+            list: List of chat messages, oldest first
+        """
+        logger.debug("Getting conversation context for user %s", self.user_id)
+        return await self.message_history.aget_messages()
+
+    async def aget_history_page(self, n: int, after_id: str = None):
+        """
+        Get a page of messages as plain (type, content) pairs plus a cursor.
+        
+        Args:
+            n (int): Maximum number of messages to return; all messages if not positive
+            after_id (str, optional): Cursor from a previous page; only messages
+                stored after it are returned
+            
+        Returns:
+            tuple: (list of (type, content) tuples oldest first, cursor for the
+                next page or None if there are no messages)
+        """
+        logger.debug("Getting a page of %s messages after %s for user %s", n, after_id, self.user_id)
+        items = await self.message_history.apage(n, ObjectId(after_id) if after_id else None)
+        messages = [(item["type"], item["data"]["content"]) for _, item in items]
+        next_cursor = str(items[-1][0]) if items else after_id
+        return messages, next_cursor
+
+    async def aadd_exchange(self, user_message: str, ai_message: str):
+        """
+        Add a user message and the AI's reply to chat history in one write.
+        
+        Args:
+            user_message (str): The user's message
+            ai_message (str): The AI's reply
+        """
+        logger.debug("Adding user and AI messages for user %s", self.user_id)
+        await self.message_history.aadd_messages([HumanMessage(content=user_message), AIMessage(content=ai_message)])
+
+    async def aadd_exchanges(self, exchanges):
+        """
+        Add several user messages and the AI's replies to chat history in one write.
+        
+        Args:
+            exchanges (list): (user message, AI reply) pairs, stored in the given order
+        """
+        logger.debug("Adding %s exchanges for user %s", len(exchanges), self.user_id)
+        await self.message_history.aadd_messages([
+            message
+            for user_message, ai_message in exchanges
+            for message in (HumanMessage(content=user_message), AIMessage(content=ai_message))
+        ])
 
     def add_user_message(self, message: str):
         """
@@ -81,7 +550,7 @@ class MongoDBConversationMemory:
         Args:
             message (str): The message to add
         """
-        logger.debug(f"Adding user message for user {self.user_id}")
+        logger.debug("Adding user message for user %s", self.user_id)
         self.message_history.add_user_message(message)
 
     def add_ai_message(self, message: str):
@@ -91,25 +560,70 @@ class MongoDBConversationMemory:
         Args:
             message (str): The message to add
         """
-        logger.debug(f"Adding AI message for user {self.user_id}")
+        logger.debug("Adding AI message for user %s", self.user_id)
         self.message_history.add_ai_message(message)
 
     def clear_history(self):
         """Clear chat history for the session."""
-        logger.info(f"Clearing chat history for user {self.user_id}")
+        logger.info("Clearing chat history for user %s", self.user_id)
         self.message_history.clear()
     
+    async def aclear_history(self):
+        """Async version of `clear_history`."""
+        logger.info("Clearing chat history for user %s", self.user_id)
+        await self.message_history.aclear()
+    
+    def close(self):
+        """
+        Release the conversation memory.
+        
+        The MongoDB client is shared with other memories, so it is left open;
+        it is closed by whoever created it.
+        """
+        logger.debug("Closing conversation memory for user %s", self.user_id)
+    
+    def _create_history(self, session_id):
+        """
+        Create a chat history for a session on the shared MongoDB clients.
+        
+        Args:
+            session_id (str): The session ID
+            
+        Returns:
+            WindowedMongoDBChatMessageHistory: The chat history for the session
+        """
+        return WindowedMongoDBChatMessageHistory(
+            connection_string=None,
+            session_id=session_id,
+            database_name=self.database_name,
+            collection_name=self.collection_name,
+            client=self.client,
+            window=2 * self.k,
+            async_collection=_async_client[self.database_name][self.collection_name] if _async_client else None,
+            unacknowledged_writes=UNACKNOWLEDGED_HISTORY_WRITES,
+            create_index=False,
+        )
+    
     def create_runnable_with_history(self, runnable):
         """
         Create a runnable with message history.
         
+        The wrapper is built once per wrapped runnable and reused afterwards.
+        
+        Small talk (see `needs_history`) is answered without reading the
+        history from MongoDB, and the exchange isn't stored, so it neither
+        costs a round-trip nor crowds real context out of the window.
+        
         Args:
             runnable: The runnable to wrap with message history
             
         Returns:
-            RunnableWithMessageHistory: The wrapped runnable
+            Runnable: The wrapped runnable
         """
-        logger.debug(f"Creating runnable with history for user {self.user_id}")
+        if self._wrapped is not None and self._wrapped_for is runnable:
+            return self._wrapped
+        
+        logger.debug("Creating runnable with history for user %s", self.user_id)
         
         # Create a configurable runnable with history
         runnable_with_history = RunnableWithMessageHistory(
@@ -121,8 +635,17 @@ class MongoDBConversationMemory:
             output_messages_key="output",
         )
         
-        logger.info(f"Created runnable with history for user {self.user_id}")
-        return runnable_with_history
+        without_history = RunnablePassthrough.assign(chat_history=lambda _: []) | runnable
+        gated_runnable = RunnableBranch(
+            (lambda inputs: not needs_history(inputs["input"]), without_history),
+            runnable_with_history,
+        )
+        
+        self._wrapped = gated_runnable
+        self._wrapped_for = runnable
+        
+        logger.info("Created runnable with history for user %s", self.user_id)
+        return gated_runnable
     
     def _get_session_history(self, session_id):
         """
@@ -134,18 +657,13 @@ class MongoDBConversationMemory:
         Returns:
             MongoDBChatMessageHistory: The chat history for the session
         """
-        logger.debug(f"Getting session history for session {session_id}")
+        logger.debug("Getting session history for session %s", session_id)
         
         # If the session_id matches our user_id, return the existing chat history
         if session_id == self.user_id:
             return self.message_history
         
         # Otherwise, create a new chat history for the specified session
-        return MongoDBChatMessageHistory(
-            session_id=session_id,
-            connection_string=os.getenv("MONGO_URI"),
-            database_name=os.getenv("MONGO_DB"),
-            collection_name=os.getenv("MONGO_COLLECTION"),
-        )
+        return self._create_history(session_id)
     
     
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+ASGI middleware for the Weather Agent API.
+
+These middlewares are written against the raw ASGI interface so that they
+add as little work as possible to every request: all header values are
+encoded once when the middleware is constructed and reused afterwards.
+"""
+
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from logger_config import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__)
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _json_error_response(status: int, detail: str, headers: Headers = ()):
+    """
+    Build the ASGI messages for a JSON error response.
+
+    Args:
+        status: The HTTP status code
+        detail: The error detail, sent as {"detail": ...}
+        headers: Extra response headers
+
+    Returns:
+        tuple: The (http.response.start, http.response.body) messages
+    """
+    body = ('{"detail":"%s"}' % detail).encode("utf-8")
+    start = {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ] + list(headers),
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+
+def _get_header(scope, name: bytes) -> bytes:
+    """
+    Get a request header value from an ASGI scope.
+
+    Args:
+        scope: The ASGI connection scope
+        name: The lowercase header name
+
+    Returns:
+        bytes: The header value, or b"" if the header is missing
+    """
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return b""
+
+
+class ASGICORSMiddleware:
+    """
+    Pure ASGI CORS middleware for an explicit origin allowlist.
+
+    Preflight requests from allowed origins are answered directly with a
+    prebuilt header set. Other requests from allowed origins get the
+    allow-origin/credentials headers appended to the response start message.
+    Requests without an Origin header pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        allow_origins: Iterable[str] = (),
+        allow_methods: Iterable[str] = ("GET", "POST", "DELETE"),
+        allow_headers: Iterable[str] = ("authorization", "content-type"),
+        allow_credentials: bool = True,
+        max_age: int = 600,
+    ):
+        """
+        Initialize the middleware and precompute the CORS headers.
+
+        Args:
+            app: The ASGI application to wrap
+            allow_origins: Origins allowed to make cross-origin requests
+            allow_methods: Methods allowed in cross-origin requests
+            allow_headers: Request headers allowed in cross-origin requests
+            allow_credentials: Whether to allow credentials (cookies, auth headers)
+            max_age: How long browsers may cache preflight responses, in seconds
+        """
+        self.app = app
+        self.allow_origins = frozenset(origin.encode("latin-1") for origin in allow_origins)
+        self.allow_methods = frozenset(method.upper().encode("latin-1") for method in allow_methods)
+        self.allow_headers = frozenset(header.lower().encode("latin-1") for header in allow_headers)
+
+        credentials: Headers = [(b"access-control-allow-credentials", b"true")] if allow_credentials else []
+        simple_headers: Headers = credentials + [(b"vary", b"Origin")]
+        preflight_headers: Headers = credentials + [
+            (b"access-control-allow-methods", b", ".join(sorted(self.allow_methods))),
+            (b"access-control-allow-headers", b", ".join(sorted(self.allow_headers))),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"vary", b"Origin"),
+            (b"content-length", b"0"),
+        ]
+
+        # The origin list is fixed, so build each origin's complete header lists up front
+        self._simple_headers = {
+            origin: [(b"access-control-allow-origin", origin)] + simple_headers
+            for origin in self.allow_origins
+        }
+        self._preflight_headers = {
+            origin: [(b"access-control-allow-origin", origin)] + preflight_headers
+            for origin in self.allow_origins
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        send = await self.apply(scope, send)
+        if send is not None:
+            await self.app(scope, receive, send)
+
+    async def apply(self, scope, send):
+        """
+        Apply CORS to an HTTP request.
+
+        Args:
+            scope: The ASGI connection scope
+            send: The ASGI send callable
+
+        Returns:
+            The send callable to pass on (adding CORS headers where needed),
+            or None if the request was a preflight that has been answered
+        """
+        origin = _get_header(scope, b"origin")
+        if not origin:
+            return send
+
+        if scope["method"] == "OPTIONS" and _get_header(scope, b"access-control-request-method"):
+            await self._preflight(scope, origin, send)
+            return None
+
+        extra_headers = self._simple_headers.get(origin)
+        if extra_headers is None:
+            return send
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + extra_headers
+            await send(message)
+
+        return send_with_cors
+
+    async def _preflight(self, scope, origin: bytes, send):
+        """
+        Answer a CORS preflight request without calling the application.
+
+        Args:
+            scope: The ASGI connection scope
+            origin: The request's Origin header value
+            send: The ASGI send callable
+        """
+        requested_method = _get_header(scope, b"access-control-request-method").upper()
+        requested_headers = _get_header(scope, b"access-control-request-headers").lower()
+
+        allowed = origin in self.allow_origins and requested_method in self.allow_methods
+        if allowed and requested_headers:
+            allowed = all(
+                header.strip() in self.allow_headers
+                for header in requested_headers.split(b",")
+                if header.strip()
+            )
+
+        if not allowed:
+            logger.debug("Rejected CORS preflight from origin %s", origin.decode("latin-1"))
+            body = b"Disallowed CORS request"
+            await send({
+                "type": "http.response.start",
+                "status": 400,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 204,
+            "headers": self._preflight_headers[origin],
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+
+class AuthMiddleware:
+    """
+    Pure ASGI bearer-token authentication.
+
+    Requests to paths outside `public_paths` must carry an
+    `Authorization: Bearer <token>` header that the injected `authenticate`
+    callable accepts. The authenticated user is stored in
+    `scope["state"]["user"]`; failures are answered with a prebuilt 401.
+    """
+
+    def __init__(
+        self,
+        app,
+        authenticate: Callable[[str], Awaitable[Optional[str]]],
+        public_paths: Iterable[str] = (),
+    ):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: The ASGI application to wrap
+            authenticate: Coroutine function returning the user for a token, or None if invalid
+            public_paths: Paths that don't require authentication
+        """
+        self.app = app
+        self.authenticate = authenticate
+        self.public_paths = frozenset(public_paths)
+
+        bearer = [(b"www-authenticate", b"Bearer")]
+        self._not_authenticated = _json_error_response(401, "Not authenticated", bearer)
+        self._invalid_credentials = _json_error_response(401, "Invalid authentication credentials", bearer)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or await self.authorize(scope, send):
+            await self.app(scope, receive, send)
+
+    async def authorize(self, scope, send) -> bool:
+        """
+        Authenticate an HTTP request.
+
+        Args:
+            scope: The ASGI connection scope
+            send: The ASGI send callable, used to answer rejected requests
+
+        Returns:
+            bool: True if the request may proceed, False if a 401 has been sent
+        """
+        if scope["method"] == "OPTIONS" or scope["path"] in self.public_paths:
+            return True
+
+        scheme, _, token = _get_header(scope, b"authorization").partition(b" ")
+        if scheme.lower() != b"bearer" or not token:
+            await self._reject(send, self._not_authenticated)
+            return False
+
+        user = await self.authenticate(token.decode("latin-1"))
+        if user is None:
+            await self._reject(send, self._invalid_credentials)
+            return False
+
+        scope.setdefault("state", {})["user"] = user
+        return True
+
+    async def _reject(self, send, response):
+        """Send one of the prebuilt 401 responses."""
+        start, body = response
+        await send(start)
+        await send(body)
+
+
+class CORSAuthMiddleware(ASGICORSMiddleware):
+    """
+    CORS and bearer-token authentication in a single ASGI layer.
+
+    Equivalent to wrapping the app in AuthMiddleware and then
+    ASGICORSMiddleware, but each request passes through one middleware call
+    instead of two. Preflights are answered before authentication, and 401
+    responses carry the CORS headers so browsers can read them.
+    """
+
+    def __init__(
+        self,
+        app,
+        authenticate: Callable[[str], Awaitable[Optional[str]]],
+        public_paths: Iterable[str] = (),
+        **cors_options,
+    ):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: The ASGI application to wrap
+            authenticate: Coroutine function returning the user for a token, or None if invalid
+            public_paths: Paths that don't require authentication
+            **cors_options: Passed through to ASGICORSMiddleware
+        """
+        super().__init__(app, **cors_options)
+        self.auth = AuthMiddleware(app, authenticate, public_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        send = await self.apply(scope, send)
+        if send is not None and await self.auth.authorize(scope, send):
+            await self.app(scope, receive, send)
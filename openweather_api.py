@@ -1,7 +1,15 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import asyncio
+import functools
+import threading
+from typing import NamedTuple
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
-import datetime
+from datetime import datetime
 from logger_config import setup_logger
 
 # Load environment variables from .env file
@@ -10,6 +18,148 @@ load_dotenv()
 # Set up logger
 logger = setup_logger(__name__)
 
+# How long API results are reused, in seconds. City coordinates practically never
+# change; OpenWeather refreshes current conditions about every 10 minutes.
+GEO_CACHE_TTL = int(os.getenv("OPENWEATHER_GEO_CACHE_TTL", "86400"))
+WEATHER_CACHE_TTL = int(os.getenv("OPENWEATHER_WEATHER_CACHE_TTL", "600"))
+FORECAST_CACHE_TTL = int(os.getenv("OPENWEATHER_FORECAST_CACHE_TTL", "600"))
+
+# Timeout for the blocking requests, in seconds (same setting as the async client)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10.0"))
+
+# Most async OpenWeather requests in flight at once, to stay inside the API's rate limit
+OPENWEATHER_MAX_CONCURRENCY = int(os.getenv("OPENWEATHER_MAX_CONCURRENCY", "10"))
+
+# strftime formats used by the formatters
+TIME_FORMAT = "%H:%M"
+DAY_FORMAT = "%A"
+DATE_FORMAT = "%B %d"
+
+# Output templates, filled by the formatters
+MISSING_VALUE = "N/A"
+CURRENT_WEATHER_TEMPLATE = """
+                ## Current Weather for {location_name} {emoji}
+
+                **Conditions:** {description}
+                **Temperature:** {temp}°C (Feels like: {feels_like}°C)
+                **Range:** {temp_min}°C to {temp_max}°C
+                **Humidity:** {humidity}%
+                **Pressure:** {pressure} hPa
+                **Wind:** {wind_speed} m/s at {wind_direction}
+                **Cloud Cover:** {clouds}%
+                            """
+FORECAST_ENTRY_TEMPLATE = (
+    "**{time}** {emoji} {description}\n"
+    "🌡️ Temp: {temp}°C (Feels like: {feels_like}°C)\n"
+    "💧 Humidity: {humidity}%\n"
+    "💨 Wind: {wind_speed} m/s at {wind_direction}\n"
+)
+
+
+# Compass points, one per 22.5° sector starting at north
+WIND_DIRECTIONS = ("N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+                   "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW")
+WIND_SECTOR_DEGREES = 360 / len(WIND_DIRECTIONS)
+
+# Emoji per OpenWeather main condition
+WEATHER_EMOJIS = {
+    "Clear": "☀️",
+    "Clouds": "☁️",
+    "Rain": "🌧️",
+    "Drizzle": "🌦️",
+    "Thunderstorm": "⛈️",
+    "Snow": "❄️",
+    "Mist": "🌫️",
+    "Smoke": "🌫️",
+    "Haze": "🌫️",
+    "Dust": "🌫️",
+    "Fog": "🌫️",
+    "Sand": "🌫️",
+    "Ash": "🌫️",
+    "Squall": "💨",
+    "Tornado": "🌪️"
+}
+DEFAULT_WEATHER_EMOJI = "🌡️"
+
+
+class ForecastEntry(NamedTuple):
+    """One 3-hour forecast slot, flattened from the API's nested dict."""
+    time: datetime
+    temp: float
+    feels_like: float
+    description: str
+    main: str
+    humidity: int
+    wind_speed: float
+    wind_deg: float
+    rain: float
+    snow: float
+
+
+def _coordinates_key(lat, lon):
+    """
+    Round coordinates for use in a cache key.
+    
+    Three decimals is about 100 m, well inside one OpenWeather grid cell, so
+    lookups for the same place share a cached response even when their
+    coordinates differ in the last digits.
+    """
+    return round(float(lat), 3), round(float(lon), 3)
+
+
+class _CachedResponse(dict):
+    """
+    A weather or forecast response kept in a response cache.
+    
+    Replies formatted from the response are kept on it, keyed by the
+    normalized city and country, so they expire together with the data they
+    were formatted from.
+    """
+    __slots__ = ("replies",)
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.replies = {}
+
+
+def _reuses_replies(format_reply):
+    """Reuse a reply already formatted from the same cached response for the same place."""
+    @functools.wraps(format_reply)
+    def wrapper(self, data, city_name, country_code=None):
+        replies = getattr(data, "replies", None)
+        if replies is None:
+            return format_reply(self, data, city_name, country_code)
+        key = (city_name.strip().lower(), (country_code or "").lower())
+        reply = replies.get(key)
+        if reply is None:
+            reply = replies[key] = format_reply(self, data, city_name, country_code)
+        return reply
+    return wrapper
+
+
+def create_session():
+    """
+    Create a requests session for the blocking OpenWeather calls.
+    
+    The session keeps connections alive between calls instead of opening a
+    new TCP/TLS connection for every request, and retries transient server
+    errors with a short backoff.
+    
+    Returns:
+        requests.Session: The configured session
+    """
+    retry = Retry(
+        total=2,
+        backoff_factor=0.1,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+    )
+    adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
 class OpenWeather:
     """
@@ -24,14 +174,51 @@ class OpenWeather:
     FORECAST_URL = os.getenv("OPENWEATHER_FORECAST_URL")
     MAP_URL = os.getenv("OPENWEATHER_MAP_URL")
 
-    def __init__(self):
-        """Initialize the OpenWeather client with API key from environment variables."""
+    def __init__(self, http_client=None):
+        """
+        Initialize the OpenWeather client with API key from environment variables.
+        
+        Args:
+            http_client (httpx.AsyncClient, optional): Shared async HTTP client used by
+                the `aget_*` methods. Without one they fall back to the blocking
+                methods in a worker thread.
+        """
         self.api_key = os.getenv("OPENWEATHER_API_KEY")
+        self.http_client = http_client
+        # Pooled keep-alive connections for the blocking methods
+        self.session = create_session()
+        
+        # Successful responses, shared by the blocking and async methods
+        self._geo_cache = TTLCache(maxsize=10000, ttl=GEO_CACHE_TTL)
+        self._weather_cache = TTLCache(maxsize=1000, ttl=WEATHER_CACHE_TTL)
+        self._forecast_cache = TTLCache(maxsize=1000, ttl=FORECAST_CACHE_TTL)
+        # The blocking methods may run in worker threads
+        self._cache_lock = threading.Lock()
+        # Geolocation lookups in progress on the event loop, keyed like the cache
+        self._geo_inflight = {}
+        # Caps concurrent async requests; calls beyond it wait for a free slot
+        self._request_slots = asyncio.Semaphore(OPENWEATHER_MAX_CONCURRENCY)
         if not self.api_key:
             logger.error(
                 "OpenWeather API key not found in environment variables")
         logger.debug("OpenWeather client initialized")
 
+    def _cached(self, cache, key):
+        """Return a cached response, or None if there is none."""
+        with self._cache_lock:
+            return cache.get(key)
+
+    def _store(self, cache, key, value):
+        """Cache a successful response and return it."""
+        with self._cache_lock:
+            cache[key] = value
+        return value
+
+    async def _aget(self, url, params):
+        """Send a GET request through the async client once a request slot is free."""
+        async with self._request_slots:
+            return await self.http_client.get(url, params=params)
+
     def get_geolocation(self, city_name, country_code=None, state_code=None, limit=1):
         """
         Get geolocation data for a city.
@@ -45,25 +232,29 @@ class OpenWeather:
         Returns:
             list: List of geolocation data (empty list if the request failed)
         """
+        key = (city_name.strip().lower(), (country_code or "").lower(), (state_code or "").lower(), limit)
+        cached = self._cached(self._geo_cache, key)
+        if cached is not None:
+            return cached
+        
         params = {
             "q": f"{city_name},{state_code},{country_code}" if state_code and country_code else city_name,
             "limit": limit,
             "appid": self.api_key
         }
-        logger.debug(f"Getting geolocation for {city_name}")
+        logger.debug("Getting geolocation for %s", city_name)
         try:
-            response = requests.get(self.GEO_URL, params=params)
+            response = self.session.get(self.GEO_URL, params=params, timeout=HTTP_TIMEOUT)
             if response.status_code == 200:
-                logger.info(
-                    f"Successfully retrieved geolocation for {city_name}")
-                return response.json()
+                logger.info("Successfully retrieved geolocation for %s", city_name)
+                locations = orjson.loads(response.content)
+                # An unknown city may be added later, so only cache hits
+                return self._store(self._geo_cache, key, locations) if locations else locations
             else:
-                logger.warning(
-                    f"Failed to get geolocation for {city_name}: {response.status_code}")
+                logger.warning("Failed to get geolocation for %s: %s", city_name, response.status_code)
                 return []
         except Exception as e:
-            logger.error(
-                f"Error getting geolocation for {city_name}: {str(e)}")
+            logger.error("Error getting geolocation for %s: %s", city_name, str(e))
             return []
 
     def get_current_weather(self, lat, lon, units="metric", lang="en"):
@@ -79,6 +270,11 @@ class OpenWeather:
         Returns:
             dict or None: Weather data or None if the request failed
         """
+        key = (*_coordinates_key(lat, lon), units, lang)
+        cached = self._cached(self._weather_cache, key)
+        if cached is not None:
+            return cached
+        
         params = {
             "lat": lat,
             "lon": lon,
@@ -86,19 +282,17 @@ class OpenWeather:
             "lang": lang,
             "appid": self.api_key
         }
-        logger.debug(f"Getting current weather for coordinates: {lat}, {lon}")
+        logger.debug("Getting current weather for coordinates: %s, %s", lat, lon)
         try:
-            response = requests.get(self.BASE_URL, params=params)
+            response = self.session.get(self.BASE_URL, params=params, timeout=HTTP_TIMEOUT)
             if response.status_code == 200:
-                logger.info(
-                    f"Successfully retrieved current weather for coordinates: {lat}, {lon}")
-                return response.json()
+                logger.info("Successfully retrieved current weather for coordinates: %s, %s", lat, lon)
+                return self._store(self._weather_cache, key, _CachedResponse(orjson.loads(response.content)))
             else:
-                logger.warning(
-                    f"Failed to get current weather: {response.status_code}")
+                logger.warning("Failed to get current weather: %s", response.status_code)
                 return None
         except Exception as e:
-            logger.error(f"Error getting current weather: {str(e)}")
+            logger.error("Error getting current weather: %s", str(e))
             return None
 
     def get_forecast(self, lat, lon, units="metric", lang="en", cnt=40):
@@ -115,6 +309,11 @@ class OpenWeather:
         Returns:
             dict or None: Forecast data or None if the request failed
         """
+        key = (*_coordinates_key(lat, lon), units, lang, cnt)
+        cached = self._cached(self._forecast_cache, key)
+        if cached is not None:
+            return cached
+        
         params = {
             "lat": lat,
             "lon": lon,
@@ -123,19 +322,17 @@ class OpenWeather:
             "cnt": cnt,
             "appid": self.api_key
         }
-        logger.debug(f"Getting forecast for coordinates: {lat}, {lon}")
+        logger.debug("Getting forecast for coordinates: %s, %s", lat, lon)
         try:
-            response = requests.get(self.FORECAST_URL, params=params)
+            response = self.session.get(self.FORECAST_URL, params=params, timeout=HTTP_TIMEOUT)
             if response.status_code == 200:
-                logger.info(
-                    f"Successfully retrieved forecast for coordinates: {lat}, {lon}")
-                return response.json()
+                logger.info("Successfully retrieved forecast for coordinates: %s, %s", lat, lon)
+                return self._store(self._forecast_cache, key, _CachedResponse(orjson.loads(response.content)))
             else:
-                logger.warning(
-                    f"Failed to get forecast: {response.status_code}")
+                logger.warning("Failed to get forecast: %s", response.status_code)
                 return None
         except Exception as e:
-            logger.error(f"Error getting forecast: {str(e)}")
+            logger.error("Error getting forecast: %s", str(e))
             return None
 
     def get_weather_forecast(self, lat, lon, units="metric", lang="en", cnt=40):
@@ -154,6 +351,181 @@ class OpenWeather:
         """
         return self.get_forecast(lat, lon, units, lang, cnt)
 
+    async def aget_geolocation(self, city_name, country_code=None, state_code=None, limit=1):
+        """
+        Async version of get_geolocation using the shared HTTP client.
+        
+        Args:
+            city_name (str): Name of the city
+            country_code (str, optional): Two-letter country code
+            state_code (str, optional): State code (mainly for US locations)
+            limit (int, optional): Maximum number of results to return
+            
+        Returns:
+            list: List of geolocation data (empty list if the request failed)
+        """
+        key = (city_name.strip().lower(), (country_code or "").lower(), (state_code or "").lower(), limit)
+        cached = self._cached(self._geo_cache, key)
+        if cached is not None:
+            return cached
+        
+        # The agent runs a turn's tool calls concurrently, so current weather and
+        # forecast for the same city geocode at the same time; share one lookup
+        task = self._geo_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._aget_geolocation(key, city_name, country_code, state_code, limit))
+            self._geo_inflight[key] = task
+            task.add_done_callback(lambda _: self._geo_inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _aget_geolocation(self, key, city_name, country_code, state_code, limit):
+        """Fetch geolocation data for aget_geolocation after a cache miss."""
+        if self.http_client is None:
+            return await asyncio.to_thread(self.get_geolocation, city_name, country_code, state_code, limit)
+        
+        params = {
+            "q": f"{city_name},{state_code},{country_code}" if state_code and country_code else city_name,
+            "limit": limit,
+            "appid": self.api_key
+        }
+        logger.debug("Getting geolocation for %s", city_name)
+        try:
+            response = await self._aget(self.GEO_URL, params)
+            if response.status_code == 200:
+                logger.info("Successfully retrieved geolocation for %s", city_name)
+                locations = orjson.loads(response.content)
+                # An unknown city may be added later, so only cache hits
+                return self._store(self._geo_cache, key, locations) if locations else locations
+            else:
+                logger.warning("Failed to get geolocation for %s: %s", city_name, response.status_code)
+                return []
+        except Exception as e:
+            logger.error("Error getting geolocation for %s: %s", city_name, str(e))
+            return []
+
+    async def aget_geolocations(self, city_names, country_code=None):
+        """
+        Get geolocation data for several cities concurrently.
+
+        Cached cities are answered from the cache, and repeated names share
+        one lookup, so only distinct uncached cities reach the API.
+
+        Args:
+            city_names (list): Names of the cities
+            country_code (str, optional): Two-letter country code for all of them
+
+        Returns:
+            list: One geolocation result list per city, in the order given
+        """
+        return list(await asyncio.gather(
+            *(self.aget_geolocation(city_name, country_code) for city_name in city_names)
+        ))
+
+    async def aget_current_weather(self, lat, lon, units="metric", lang="en"):
+        """
+        Async version of get_current_weather using the shared HTTP client.
+        
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+            units (str, optional): Units of measurement ('metric', 'imperial', or 'standard')
+            lang (str, optional): Language code for the response
+            
+        Returns:
+            dict or None: Weather data or None if the request failed
+        """
+        key = (*_coordinates_key(lat, lon), units, lang)
+        cached = self._cached(self._weather_cache, key)
+        if cached is not None:
+            return cached
+        
+        if self.http_client is None:
+            return await asyncio.to_thread(self.get_current_weather, lat, lon, units, lang)
+        
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "units": units,
+            "lang": lang,
+            "appid": self.api_key
+        }
+        logger.debug("Getting current weather for coordinates: %s, %s", lat, lon)
+        try:
+            response = await self._aget(self.BASE_URL, params)
+            if response.status_code == 200:
+                logger.info("Successfully retrieved current weather for coordinates: %s, %s", lat, lon)
+                return self._store(self._weather_cache, key, _CachedResponse(orjson.loads(response.content)))
+            else:
+                logger.warning("Failed to get current weather: %s", response.status_code)
+                return None
+        except Exception as e:
+            logger.error("Error getting current weather: %s", str(e))
+            return None
+
+    async def aget_forecast(self, lat, lon, units="metric", lang="en", cnt=40):
+        """
+        Async version of get_forecast using the shared HTTP client.
+        
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+            units (str, optional): Units of measurement ('metric', 'imperial', or 'standard')
+            lang (str, optional): Language code for the response
+            cnt (int, optional): Number of timestamps to return (max 40)
+            
+        Returns:
+            dict or None: Forecast data or None if the request failed
+        """
+        key = (*_coordinates_key(lat, lon), units, lang, cnt)
+        cached = self._cached(self._forecast_cache, key)
+        if cached is not None:
+            return cached
+        
+        if self.http_client is None:
+            return await asyncio.to_thread(self.get_forecast, lat, lon, units, lang, cnt)
+        
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "units": units,
+            "lang": lang,
+            "cnt": cnt,
+            "appid": self.api_key
+        }
+        logger.debug("Getting forecast for coordinates: %s, %s", lat, lon)
+        try:
+            response = await self._aget(self.FORECAST_URL, params)
+            if response.status_code == 200:
+                logger.info("Successfully retrieved forecast for coordinates: %s, %s", lat, lon)
+                return self._store(self._forecast_cache, key, _CachedResponse(orjson.loads(response.content)))
+            else:
+                logger.warning("Failed to get forecast: %s", response.status_code)
+                return None
+        except Exception as e:
+            logger.error("Error getting forecast: %s", str(e))
+            return None
+
+    async def aget_weather_bundle(self, lat, lon, units="metric", lang="en"):
+        """
+        Get the current weather and the forecast for a location concurrently.
+
+        The two requests are independent, so they overlap and the pair takes
+        about as long as the slower one.
+
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+            units (str, optional): Units of measurement ('metric', 'imperial', or 'standard')
+            lang (str, optional): Language code for the response
+
+        Returns:
+            tuple: (current weather, forecast), each None if its request failed
+        """
+        return tuple(await asyncio.gather(
+            self.aget_current_weather(lat, lon, units, lang),
+            self.aget_forecast(lat, lon, units, lang),
+        ))
+
     def get_weather_map_url(self, layer, z, x, y):
         """
         Get URL for a weather map tile.
@@ -179,10 +551,7 @@ class OpenWeather:
         Returns:
             str: Cardinal direction (N, NE, E, etc.)
         """
-        directions = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
-                      "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
-        index = round(degrees / (360 / len(directions))) % len(directions)
-        return directions[index]
+        return WIND_DIRECTIONS[round(degrees / WIND_SECTOR_DEGREES) & 15]
 
     def _get_weather_emoji(self, weather_main):
         """
@@ -194,25 +563,9 @@ class OpenWeather:
         Returns:
             str: Emoji representing the weather condition
         """
-        weather_emojis = {
-            "Clear": "☀️",
-            "Clouds": "☁️",
-            "Rain": "🌧️",
-            "Drizzle": "🌦️",
-            "Thunderstorm": "⛈️",
-            "Snow": "❄️",
-            "Mist": "🌫️",
-            "Smoke": "🌫️",
-            "Haze": "🌫️",
-            "Dust": "🌫️",
-            "Fog": "🌫️",
-            "Sand": "🌫️",
-            "Ash": "🌫️",
-            "Squall": "💨",
-            "Tornado": "🌪️"
-        }
-        return weather_emojis.get(weather_main, "🌡️")
+        return WEATHER_EMOJIS.get(weather_main, DEFAULT_WEATHER_EMOJI)
 
+    @_reuses_replies
     def format_current_weather(self, weather_data, city_name, country_code=None):
         """
         Format current weather data into a human-readable string.
@@ -225,75 +578,101 @@ class OpenWeather:
         Returns:
             str: Formatted weather information
         """
-        logger.debug(f"Formatting current weather data for {city_name}")
+        logger.debug("Formatting current weather data for %s", city_name)
         try:
-            # Extract data
+            # Extract data, looking up each section once; fields missing from a
+            # partial payload show as N/A instead of failing the whole report
             location_name = f"{city_name}, {country_code.upper()}" if country_code else city_name
-            temp = weather_data["main"]["temp"]
-            feels_like = weather_data["main"]["feels_like"]
-            temp_min = weather_data["main"]["temp_min"]
-            temp_max = weather_data["main"]["temp_max"]
-            humidity = weather_data["main"]["humidity"]
-            pressure = weather_data["main"]["pressure"]
-            wind_speed = weather_data["wind"]["speed"]
-            wind_deg = weather_data["wind"]["deg"]
-            clouds = weather_data["clouds"]["all"]
-            weather_desc = weather_data["weather"][0]["description"]
-            weather_main = weather_data["weather"][0]["main"]
+            main = weather_data.get("main") or {}
+            wind = weather_data.get("wind") or {}
+            conditions = (weather_data.get("weather") or [{}])[0]
+            wind_deg = wind.get("deg")
 
             # Get weather emoji
-            weather_emoji = self._get_weather_emoji(weather_main)
-
-            # Format the response
-            response = f"""
-                ## Current Weather for {location_name} {weather_emoji}
-
-                **Conditions:** {weather_desc.capitalize()}
-                **Temperature:** {temp}°C (Feels like: {feels_like}°C)
-                **Range:** {temp_min}°C to {temp_max}°C
-                **Humidity:** {humidity}%
-                **Pressure:** {pressure} hPa
-                **Wind:** {wind_speed} m/s at {self._get_wind_direction(wind_deg)}
-                **Cloud Cover:** {clouds}%
-                            """
+            weather_emoji = self._get_weather_emoji(conditions.get("main"))
+
+            # Format the response, collecting the pieces and joining once at the end
+            parts = [CURRENT_WEATHER_TEMPLATE.format(
+                location_name=location_name,
+                emoji=weather_emoji,
+                description=conditions.get("description", "").capitalize() or MISSING_VALUE,
+                temp=main.get("temp", MISSING_VALUE),
+                feels_like=main.get("feels_like", MISSING_VALUE),
+                temp_min=main.get("temp_min", MISSING_VALUE),
+                temp_max=main.get("temp_max", MISSING_VALUE),
+                humidity=main.get("humidity", MISSING_VALUE),
+                pressure=main.get("pressure", MISSING_VALUE),
+                wind_speed=wind.get("speed", MISSING_VALUE),
+                wind_direction=MISSING_VALUE if wind_deg is None else self._get_wind_direction(wind_deg),
+                clouds=(weather_data.get("clouds") or {}).get("all", MISSING_VALUE),
+            )]
 
             # Add sunrise and sunset if available
-            if "sys" in weather_data and "sunrise" in weather_data["sys"] and "sunset" in weather_data["sys"]:
-                sunrise = datetime.datetime.fromtimestamp(
-                    weather_data["sys"]["sunrise"]).strftime("%H:%M")
-                sunset = datetime.datetime.fromtimestamp(
-                    weather_data["sys"]["sunset"]).strftime("%H:%M")
-                response += f"""
+            sys_data = weather_data.get("sys") or {}
+            if "sunrise" in sys_data and "sunset" in sys_data:
+                sunrise = datetime.fromtimestamp(sys_data["sunrise"]).strftime(TIME_FORMAT)
+                sunset = datetime.fromtimestamp(sys_data["sunset"]).strftime(TIME_FORMAT)
+                parts.append(f"""
 **Sunrise:** {sunrise}
 **Sunset:** {sunset}
-                """
+                """)
 
             # Add visibility if available
             if "visibility" in weather_data:
                 visibility_km = weather_data["visibility"] / 1000
-                response += f"**Visibility:** {visibility_km:.1f} km\n"
+                parts.append(f"**Visibility:** {visibility_km:.1f} km\n")
 
             # Add rain data if available
             if "rain" in weather_data:
                 if "1h" in weather_data["rain"]:
-                    response += f"**Rain (1h):** {weather_data['rain']['1h']} mm\n"
+                    parts.append(f"**Rain (1h):** {weather_data['rain']['1h']} mm\n")
                 if "3h" in weather_data["rain"]:
-                    response += f"**Rain (3h):** {weather_data['rain']['3h']} mm\n"
+                    parts.append(f"**Rain (3h):** {weather_data['rain']['3h']} mm\n")
 
             # Add snow data if available
             if "snow" in weather_data:
                 if "1h" in weather_data["snow"]:
-                    response += f"**Snow (1h):** {weather_data['snow']['1h']} mm\n"
+                    parts.append(f"**Snow (1h):** {weather_data['snow']['1h']} mm\n")
                 if "3h" in weather_data["snow"]:
-                    response += f"**Snow (3h):** {weather_data['snow']['3h']} mm\n"
+                    parts.append(f"**Snow (3h):** {weather_data['snow']['3h']} mm\n")
 
-            logger.info(
-                f"Successfully formatted current weather data for {city_name}")
-            return response
+            logger.info("Successfully formatted current weather data for %s", city_name)
+            return "".join(parts)
         except Exception as e:
-            logger.error(f"Error formatting current weather data: {str(e)}")
+            logger.error("Error formatting current weather data: %s", str(e))
             return f"Error formatting weather data: {str(e)}"
 
+    def parse_forecast(self, forecast_data):
+        """
+        Flatten forecast data into one entry per 3-hour slot.
+        
+        Args:
+            forecast_data (dict): Forecast data from the OpenWeather API
+            
+        Returns:
+            list: ForecastEntry tuples in API order
+        """
+        fromtimestamp = datetime.fromtimestamp
+        entries = []
+        for forecast in forecast_data.get("list", []):
+            main = forecast["main"]
+            weather = forecast["weather"][0]
+            wind = forecast["wind"]
+            entries.append(ForecastEntry(
+                time=fromtimestamp(forecast["dt"]),
+                temp=main["temp"],
+                feels_like=main["feels_like"],
+                description=weather["description"],
+                main=weather["main"],
+                humidity=main["humidity"],
+                wind_speed=wind["speed"],
+                wind_deg=wind["deg"],
+                rain=forecast["rain"].get("3h", 0) if "rain" in forecast else 0,
+                snow=forecast["snow"].get("3h", 0) if "snow" in forecast else 0,
+            ))
+        return entries
+
+    @_reuses_replies
     def format_forecast(self, forecast_data, city_name, country_code=None):
         """
         Format forecast data into a human-readable string.
@@ -306,73 +685,55 @@ class OpenWeather:
         Returns:
             str: Formatted forecast information
         """
-        logger.debug(f"Formatting forecast data for {city_name}")
+        logger.debug("Formatting forecast data for %s", city_name)
         try:
-            # Extract data
-            forecast_list = forecast_data.get("list", [])
             location_name = f"{city_name}, {country_code.upper()}" if country_code else city_name
 
             # Format the header
-            result = f"## 5-Day Weather Forecast for {location_name}\n\n"
+            parts = [f"## 5-Day Weather Forecast for {location_name}\n\n"]
 
             # Group forecasts by day
             forecasts_by_day = {}
-            for forecast in forecast_list:
-                # Get date from timestamp
-                dt = datetime.datetime.fromtimestamp(forecast["dt"])
-                date_str = dt.strftime("%Y-%m-%d")
-                time_str = dt.strftime("%H:%M")
-
-                # Initialize day if not exists
-                if date_str not in forecasts_by_day:
-                    forecasts_by_day[date_str] = []
-
-                # Add forecast to day
-                forecasts_by_day[date_str].append({
-                    "time": time_str,
-                    "temp": forecast["main"]["temp"],
-                    "feels_like": forecast["main"]["feels_like"],
-                    "description": forecast["weather"][0]["description"],
-                    "main": forecast["weather"][0]["main"],
-                    "humidity": forecast["main"]["humidity"],
-                    "wind_speed": forecast["wind"]["speed"],
-                    "wind_deg": forecast["wind"]["deg"],
-                    "rain": forecast.get("rain", {}).get("3h", 0) if "rain" in forecast else 0,
-                    "snow": forecast.get("snow", {}).get("3h", 0) if "snow" in forecast else 0
-                })
-
-            # Format each day
-            for date_str, forecasts in sorted(forecasts_by_day.items()):
-                # Convert date string to datetime for better formatting
-                date_obj = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                day_name = date_obj.strftime("%A")
+            for entry in self.parse_forecast(forecast_data):
+                day_forecasts = forecasts_by_day.get(entry.time.date())
+                if day_forecasts is None:
+                    day_forecasts = forecasts_by_day[entry.time.date()] = []
+                day_forecasts.append(entry)
+
+            # Format each day, resolving the per-entry helpers once
+            get_weather_emoji = self._get_weather_emoji
+            get_wind_direction = self._get_wind_direction
+            for date_obj, forecasts in sorted(forecasts_by_day.items()):
+                day_name = date_obj.strftime(DAY_FORMAT)
 
                 # Add day header
-                result += f"### {day_name}, {date_obj.strftime('%B %d')}\n\n"
+                parts.append(f"### {day_name}, {date_obj.strftime(DATE_FORMAT)}\n\n")
 
                 # Add each forecast for the day
-                for forecast in forecasts:
-                    # Get weather emoji
-                    weather_emoji = self._get_weather_emoji(forecast["main"])
-
-                    result += f"**{forecast['time']}** {weather_emoji} {forecast['description'].capitalize()}\n"
-                    result += f"🌡️ Temp: {forecast['temp']}°C (Feels like: {forecast['feels_like']}°C)\n"
-                    result += f"💧 Humidity: {forecast['humidity']}%\n"
-                    result += f"💨 Wind: {forecast['wind_speed']} m/s at {self._get_wind_direction(forecast['wind_deg'])}\n"
+                for entry in forecasts:
+                    parts.append(FORECAST_ENTRY_TEMPLATE.format(
+                        time=entry.time.strftime(TIME_FORMAT),
+                        emoji=get_weather_emoji(entry.main),
+                        description=entry.description.capitalize(),
+                        temp=entry.temp,
+                        feels_like=entry.feels_like,
+                        humidity=entry.humidity,
+                        wind_speed=entry.wind_speed,
+                        wind_direction=get_wind_direction(entry.wind_deg),
+                    ))
 
                     # Add rain and snow if present
-                    if forecast["rain"]:
-                        result += f"🌧️ Rain: {forecast['rain']} mm\n"
-                    if forecast["snow"]:
-                        result += f"❄️ Snow: {forecast['snow']} mm\n"
+                    if entry.rain:
+                        parts.append(f"🌧️ Rain: {entry.rain} mm\n")
+                    if entry.snow:
+                        parts.append(f"❄️ Snow: {entry.snow} mm\n")
 
-                    result += "\n"
+                    parts.append("\n")
 
-            logger.info(
-                f"Successfully formatted forecast data for {city_name}")
-            return result
+            logger.info("Successfully formatted forecast data for %s", city_name)
+            return "".join(parts)
         except Exception as e:
-            logger.error(f"Error formatting forecast data: {str(e)}")
+            logger.error("Error formatting forecast data: %s", str(e))
             return f"Error formatting forecast data: {str(e)}"
 
 
@@ -2,10 +2,17 @@
 PromptCache class to manage caching of LangChain Hub prompts for the weather agent.
 """
 import os
+import time
 import datetime
+import threading
+import warnings
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List, Union, Any
 from langchain.prompts import ChatPromptTemplate, PromptTemplate
+from langchain.prompts.chat import MessagesPlaceholder
 from langchain import hub
+from langchain_core.load import dumps, loads
 from logger_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -15,10 +22,22 @@ WEATHER_PROMPT_IDS = [
     "weather_agent"
 ]
 
+# Pulled prompts are kept on disk so new processes can start without LangChain Hub
+PROMPT_CACHE_DIR = Path(os.getenv("PROMPT_CACHE_DIR", Path.home() / ".cache" / "weather_agent" / "prompts"))
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "86400"))
+
+def _today_date() -> str:
+    """Return today's date formatted for the weather prompt."""
+    return datetime.datetime.now().strftime("%A, %B %d, %Y")
+
 class PromptCache:
     """Singleton class to manage cached prompts from LangChain Hub for the weather agent."""
     _instance = None
     _prompts: Dict[str, Union[ChatPromptTemplate, PromptTemplate]] = {}
+    # Prompts prepared by get_prompt, keyed by (prompt_id, today's date)
+    _rendered: Dict[tuple, ChatPromptTemplate] = {}
+    # Makes sure threads constructing the singleton at once pull the prompts only once
+    _init_lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
@@ -28,11 +47,14 @@ class PromptCache:
     def __init__(self):
         """Initialize the cache if it hasn't been initialized yet."""
         if not self._prompts:
-            self.initialize_cache()
+            with self._init_lock:
+                if not self._prompts:
+                    self.initialize_cache()
     
     def initialize_cache(self):
         """Initialize the cache by pulling all required prompts."""
         logger.info("Initializing weather prompt cache")
+        self._rendered.clear()
         
         # Define prompt configurations with their expected types
         prompt_configs = {
@@ -40,9 +62,13 @@ class PromptCache:
             "weather_agent": "chat"
         }
         
+        # Pull all prompts at once so startup waits for the slowest pull, not their sum
+        with ThreadPoolExecutor(max_workers=min(8, len(prompt_configs))) as executor:
+            pulls = {prompt_id: executor.submit(self._pull, prompt_id) for prompt_id in prompt_configs}
+        
         for prompt_id, prompt_type in prompt_configs.items():
             try:
-                prompt = hub.pull(prompt_id)
+                prompt = pulls[prompt_id].result()
                 
                 # Validate prompt based on expected type
                 if prompt_type == "chat" and not isinstance(prompt, ChatPromptTemplate):
@@ -58,49 +84,81 @@ class PromptCache:
                 logger.error("Error caching prompt %s: %s", prompt_id, str(e))
                 self._prompts[prompt_id] = None
     
+    def _pull(self, prompt_id: str, refresh: bool = False):
+        """
+        Load a prompt from the disk cache, or pull it from LangChain Hub.
+        
+        Args:
+            prompt_id: The LangChain Hub prompt ID
+            refresh: Pull from the hub even if a fresh copy is on disk
+            
+        Returns:
+            The prompt
+        """
+        path = PROMPT_CACHE_DIR / f"{prompt_id.replace('/', '__')}.json"
+        if not refresh:
+            try:
+                if time.time() - path.stat().st_mtime < PROMPT_CACHE_TTL:
+                    # loads warns that it's in beta on every call
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        prompt = loads(path.read_text(encoding="utf-8"))
+                    logger.debug("Loaded prompt %s from %s", prompt_id, path)
+                    return prompt
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("Ignoring unreadable cached prompt %s: %s", path, str(e))
+        
+        prompt = hub.pull(prompt_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(dumps(prompt), encoding="utf-8")
+        except Exception as e:
+            logger.warning("Could not write prompt %s to %s: %s", prompt_id, path, str(e))
+        return prompt
+    
     def get_prompt(self, prompt_id: str) -> Optional[Union[ChatPromptTemplate, PromptTemplate]]:
-        """Get a prompt from the cache."""
+        """
+        Get a prompt from the cache.
+        
+        Chat prompts are prepared (date filled in, missing placeholders added)
+        once per day and reused until the date changes or the prompt is updated.
+        """
         prompt = self._prompts.get(prompt_id)
         
         # If the prompt contains TODAY_DATE placeholder, update it
         if prompt and isinstance(prompt, ChatPromptTemplate):
-            today_date = datetime.datetime.now().strftime("%A, %B %d, %Y")
+            today_date = _today_date()
+            key = (prompt_id, today_date)
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                return rendered
             
             # Create a new prompt with the updated date
             try:
-                # For newer versions of LangChain, we need to handle the messages differently
+                # For newer versions of LangChain, we need to handle the messages differently.
+                # One pass fills in the date and checks for the placeholders the agent needs.
                 updated_messages = []
+                has_agent_scratchpad = has_chat_history = False
                 for message in prompt.messages:
-                    if hasattr(message, 'prompt') and hasattr(message.prompt, 'template'):
-                        if "{TODAY_DATE}" in message.prompt.template:
-                            # Create a new message with the updated date
-                            updated_template = message.prompt.template.replace("{TODAY_DATE}", today_date)
-                            # We need to recreate the message with the updated template
-                            # This is a simplified approach and might need adjustment based on the exact structure
-                            updated_messages.append(message.__class__(prompt=message.prompt.__class__(template=updated_template)))
-                        else:
-                            updated_messages.append(message)
+                    template = getattr(getattr(message, 'prompt', None), 'template', None)
+                    if template is None:
+                        updated_messages.append(message)
+                        continue
+                    
+                    has_agent_scratchpad = has_agent_scratchpad or "{agent_scratchpad}" in template
+                    has_chat_history = has_chat_history or "{chat_history}" in template
+                    if "{TODAY_DATE}" in template:
+                        # Recreate the message with the date filled in
+                        updated_template = template.replace("{TODAY_DATE}", today_date)
+                        updated_messages.append(message.__class__(prompt=message.prompt.__class__(template=updated_template)))
                     else:
                         updated_messages.append(message)
                 
-                # Check if the prompt has the required placeholders for agent functionality
-                has_agent_scratchpad = any(
-                    hasattr(msg, 'prompt') and 
-                    hasattr(msg.prompt, 'template') and 
-                    "{agent_scratchpad}" in msg.prompt.template 
-                    for msg in prompt.messages
-                )
-                
-                has_chat_history = any(
-                    hasattr(msg, 'prompt') and 
-                    hasattr(msg.prompt, 'template') and 
-                    "{chat_history}" in msg.prompt.template 
-                    for msg in prompt.messages
-                )
-                
                 # If the prompt is missing required placeholders, add them
                 if not has_agent_scratchpad or not has_chat_history:
-                    logger.info(f"Adding missing placeholders to prompt {prompt_id}")
+                    logger.info("Adding missing placeholders to prompt %s", prompt_id)
                     
                     # Find the last human/user message to insert chat_history before it
                     for i, msg in enumerate(updated_messages):
@@ -108,13 +166,11 @@ class PromptCache:
                             ('Human' in msg.__class__.__name__ or 'User' in msg.__class__.__name__)):
                             if not has_chat_history:
                                 # Insert chat_history before the human message
-                                from langchain.prompts.chat import MessagesPlaceholder
                                 updated_messages.insert(i, MessagesPlaceholder(variable_name="chat_history"))
                             break
                     
                     # Add agent_scratchpad at the end if it's missing
                     if not has_agent_scratchpad:
-                        from langchain.prompts.chat import MessagesPlaceholder
                         updated_messages.append(MessagesPlaceholder(variable_name="agent_scratchpad"))
                 
                 # If we made any changes, create a new prompt
@@ -130,7 +186,12 @@ class PromptCache:
                     if "question" in input_variables and "input" not in input_variables:
                         input_variables.append("input")
                     
-                    return ChatPromptTemplate(messages=updated_messages, input_variables=input_variables)
+                    rendered = ChatPromptTemplate(messages=updated_messages, input_variables=input_variables)
+                    # Only today's entry is useful; drop the ones from earlier days
+                    for stale_key in [k for k in self._rendered if k[0] == prompt_id]:
+                        del self._rendered[stale_key]
+                    self._rendered[key] = rendered
+                    return rendered
             except Exception as e:
                 logger.error("Error updating prompt: %s", str(e))
         
@@ -199,7 +260,9 @@ class PromptCache:
     def update_prompt(self, prompt_id: str) -> bool:
         """Update a specific prompt in the cache."""
         try:
-            self._prompts[prompt_id] = hub.pull(prompt_id)
+            self._prompts[prompt_id] = self._pull(prompt_id, refresh=True)
+            for stale_key in [k for k in self._rendered if k[0] == prompt_id]:
+                del self._rendered[stale_key]
             logger.info("Successfully updated cached prompt: %s", prompt_id)
             return True
         except Exception as e:
@@ -214,14 +277,16 @@ class PromptCache:
         return results
     
     def create_default_weather_prompt(self) -> ChatPromptTemplate:
-        """Create the default weather prompt template."""
-        today_date = datetime.datetime.now().strftime("%A, %B %d, %Y")
+        """
+        Create the default weather prompt template.
         
+        The system message is kept fully static so that the LLM provider can
+        reuse its cached prefix across turns and users; today's date is sent
+        in a separate message after the chat history.
+        """
         # Create a prompt template with the required agent_scratchpad and chat history
         prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""Hey there! ☀️ You're a friendly and helpful weather assistant with access to real-time weather data. 
-
-            📅 Today is **{today_date}**.
+            ("system", """Hey there! ☀️ You're a friendly and helpful weather assistant with access to real-time weather data. 
 
             🌍 **Your job is simple:** Help users with their weather-related questions using accurate, up-to-date data! 
 
@@ -254,11 +319,13 @@ class PromptCache:
             """),
             
             ("placeholder", "{chat_history}"),
+            ("system", "📅 Today is **{today_date}**."),
             ("user", "{input}"),
             ("placeholder", "{agent_scratchpad}")
         ])
         
-        return prompt
+        # Resolved on every call, so the date stays current while the prompt is cached
+        return prompt.partial(today_date=_today_date)
 
 if __name__ == "__main__":
     prompt_cache = PromptCache()
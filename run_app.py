@@ -4,10 +4,12 @@ Run Script for Weather Agent Application
 This script starts both the FastAPI backend and Streamlit frontend simultaneously.
 It uses subprocess to run both servers in parallel.
 
-Note: This script requires Streamlit version 1.30.0 or higher.
+Note: This script requires Streamlit version 1.31.0 or higher.
 """
 
 import subprocess
+import selectors
+import socket
 import sys
 import time
 import webbrowser
@@ -18,6 +20,113 @@ def open_browser(url):
     """Open the browser after a delay to ensure the server is running."""
     webbrowser.open(url)
 
+def wait_for_port(host, port, process, timeout=15.0):
+    """
+    Wait until a server accepts connections on a port.
+    
+    Args:
+        host (str): Host to connect to
+        port (int): Port to connect to
+        process (subprocess.Popen): The server process; waiting stops if it exits
+        timeout (float): Seconds to wait before giving up
+        
+    Returns:
+        bool: True once the port accepts connections, False on timeout or exit
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+    return False
+
+def watch_processes(processes):
+    """
+    Print the servers' output as it arrives until one of them exits.
+    
+    All stdout/stderr pipes are watched with a selector, so the script
+    sleeps until there is output and neither server can stall on a full
+    stderr pipe. A server has exited once both of its pipes are closed.
+    Output is relayed as raw bytes, only split into lines to add the label.
+    
+    Args:
+        processes (dict): Label -> subprocess.Popen with stdout and stderr piped
+        
+    Returns:
+        str: The label of the process that exited
+    """
+    selector = selectors.DefaultSelector()
+    open_pipes = {}
+    for label, process in processes.items():
+        for stream in (process.stdout, process.stderr):
+            os.set_blocking(stream.fileno(), False)
+            selector.register(stream.fileno(), selectors.EVENT_READ, label)
+            open_pipes[label] = open_pipes.get(label, 0) + 1
+    
+    prefixes = {label: f"[{label}] ".encode() for label in processes}
+    out = sys.stdout.buffer
+    sys.stdout.flush()
+    
+    partial_lines = {}
+    try:
+        while True:
+            for key, _ in selector.select():
+                label = key.data
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fd)
+                    rest = partial_lines.pop(key.fd, b"")
+                    if rest:
+                        out.write(prefixes[label] + rest + b"\n")
+                    open_pipes[label] -= 1
+                    if not open_pipes[label]:
+                        out.flush()
+                        processes[label].wait()
+                        return label
+                    continue
+                
+                lines = (partial_lines.pop(key.fd, b"") + data).split(b"\n")
+                partial_lines[key.fd] = lines.pop()
+                prefix = prefixes[label]
+                for line in lines:
+                    out.write(prefix + line + b"\n")
+            out.flush()
+    finally:
+        selector.close()
+
+def poll_processes(processes):
+    """
+    Print the servers' output until one of them exits, by polling.
+    
+    Used on Windows, where selectors can't watch pipes.
+    
+    Args:
+        processes (dict): Label -> subprocess.Popen with stdout and stderr piped
+        
+    Returns:
+        str: The label of the process that exited
+    """
+    while True:
+        # Check if processes are still running
+        for label, process in processes.items():
+            if process.poll() is not None:
+                error = process.stderr.read()
+                if error:
+                    print(f"{label} error: {error.decode(errors='replace')}")
+                return label
+        
+        # Print any output from the processes
+        for label, process in processes.items():
+            output = process.stdout.readline()
+            if output:
+                print(f"[{label}] {output.decode(errors='replace').strip()}")
+        
+        time.sleep(0.1)
+
 def main():
     """Start both the FastAPI backend and Streamlit frontend."""
     print("Starting Weather Agent Application...")
@@ -31,14 +140,13 @@ def main():
         [python_cmd, "app.py"],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
-        universal_newlines=True
+        bufsize=0,
     )
     
     # Wait for backend to start
     print("Waiting for backend to start...")
-    time.sleep(3)
+    if not wait_for_port("127.0.0.1", 8000, backend_process):
+        print("Backend is not accepting connections yet, starting the frontend anyway")
     
     # Start Streamlit frontend
     print("\n=== Starting Streamlit Frontend ===")
@@ -47,13 +155,11 @@ def main():
             [python_cmd, "-m", "streamlit", "run", "streamlit_app.py"],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+            bufsize=0,
         )
     except Exception as e:
         print(f"Error starting Streamlit: {str(e)}")
-        print("Make sure Streamlit is installed: pip install streamlit>=1.30.0")
+        print("Make sure Streamlit is installed: pip install streamlit>=1.31.0")
         backend_process.terminate()
         sys.exit(1)
     
@@ -67,33 +173,11 @@ def main():
     
     try:
         # Keep the script running and print output from both processes
-        while True:
-            # Check if processes are still running
-            if backend_process.poll() is not None:
-                backend_error = backend_process.stderr.read()
-                print(f"Backend process has terminated unexpectedly")
-                if backend_error:
-                    print(f"Backend error: {backend_error}")
-                break
-                
-            if frontend_process.poll() is not None:
-                frontend_error = frontend_process.stderr.read()
-                print(f"Frontend process has terminated unexpectedly")
-                if frontend_error:
-                    print(f"Frontend error: {frontend_error}")
-                break
-                
-            # Print any output from the processes
-            backend_out = backend_process.stdout.readline()
-            if backend_out:
-                print(f"[Backend] {backend_out.strip()}")
-                
-            frontend_out = frontend_process.stdout.readline()
-            if frontend_out:
-                print(f"[Frontend] {frontend_out.strip()}")
-                
-            time.sleep(0.1)
-            
+        processes = {"Backend": backend_process, "Frontend": frontend_process}
+        watch = poll_processes if sys.platform == "win32" else watch_processes
+        exited = watch(processes)
+        print(f"{exited} process has terminated unexpectedly")
+        
     except KeyboardInterrupt:
         print("\nShutting down servers...")
         
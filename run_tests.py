@@ -23,36 +23,33 @@ import sys
 import os
 import subprocess
 import argparse
-import importlib.util
+import importlib.metadata
 
 # Add the project root directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 def is_package_installed(package_name):
-    """Check if a package is installed."""
-    return importlib.util.find_spec(package_name) is not None
+    """Check if a distribution is installed, without importing it."""
+    try:
+        importlib.metadata.version(package_name)
+        return True
+    except importlib.metadata.PackageNotFoundError:
+        return False
 
-def install_package(package_name):
-    """Install a package using pip."""
-    print(f"Installing {package_name}...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
+def install_packages(package_names):
+    """Install packages using a single pip run."""
+    print(f"Installing {', '.join(package_names)}...")
+    subprocess.check_call([sys.executable, "-m", "pip", "install", *package_names])
 
 def ensure_dependencies():
     """Ensure all required dependencies are installed."""
-    required_packages = {
-        "pytest": "pytest",
-        "pytest_cov": "pytest-cov",
-    }
+    required_packages = ["pytest", "pytest-cov"]
     
-    missing_packages = []
-    for module_name, package_name in required_packages.items():
-        if not is_package_installed(module_name):
-            missing_packages.append(package_name)
+    missing_packages = [package for package in required_packages if not is_package_installed(package)]
     
     if missing_packages:
         print("Some required packages are missing. Installing them now...")
-        for package in missing_packages:
-            install_package(package)
+        install_packages(missing_packages)
         print("All required packages installed successfully.")
 
 def main():
@@ -103,14 +100,16 @@ def main():
     if args.file:
         cmd.append(f"tests/test_{args.file}.py")
     
-    # Print the command being run
-    print(f"Running: {' '.join(cmd)}")
+    # Print the command being run (flushed, since exec discards Python's buffers)
+    print(f"Running: {' '.join(cmd)}", flush=True)
     
-    # Run the tests
-    result = subprocess.run(cmd)
+    # On Windows exec spawns a new process instead of replacing this one, so wait for it there
+    if sys.platform == "win32":
+        result = subprocess.run(cmd)
+        return result.returncode
     
-    # Return the exit code
-    return result.returncode
+    # Replace this process with pytest so its exit code and signals reach the caller directly
+    os.execvp(cmd[0], cmd)
 
 if __name__ == "__main__":
     sys.exit(main()) 
\ No newline at end of file
@@ -11,15 +11,22 @@ setup(
         "langchain-core>=0.1.10",
         "langchain-openai>=0.0.5",
         "langchain-mongodb>=0.0.1",
-        "pymongo>=4.5.0",
+        "pymongo>=4.13.0",
         "openai>=1.3.0",
         "pytz>=2023.3",
         "fastapi>=0.104.0",
+        "starlette>=0.46.0",
         "uvicorn>=0.23.2",
+        "uvloop>=0.19.0; sys_platform != 'win32'",
+        "httptools>=0.6.0",
         "pydantic>=2.4.2",
         "python-multipart>=0.0.5",
         "python-jose>=3.3.0",
-        "streamlit>=1.30.0",
+        "cachetools>=5.3.0",
+        "orjson>=3.9.0",
+        "httpx[http2,brotli]>=0.25.0",
+        "msgspec>=0.18.0",
+        "streamlit>=1.31.0",
         "bcrypt>=4.0.0",
     ],
     extras_require={
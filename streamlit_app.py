@@ -6,18 +6,65 @@ Features:
 - User authentication
 - Real-time chat with Stormy, your weather assistant
 - Chat history management
-- Streamed responses for a smoother experience
+- Responses streamed token by token as Stormy writes them
 """
 
 import streamlit as st
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import gzip
+from concurrent.futures import ThreadPoolExecutor
 import os
-from datetime import datetime
+import time
 
 # API Configuration - Use environment variable if available, otherwise default to localhost
 API_URL = os.environ.get("API_URL", "http://localhost:8080")
 
+# Chat bodies larger than this are gzip-compressed before upload
+GZIP_MIN_BYTES = 1024
+
+# Headers for unauthenticated requests with an orjson-encoded body
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Streamed reply text is redrawn at most this often (seconds); tokens in between are joined
+STREAM_FLUSH_INTERVAL = 0.05
+
+# (connect, read) timeouts in seconds; a chat reply waits on the LLM, so reads get longer
+API_TIMEOUT = (3.05, 60)
+
+# Custom styling for chat bubbles. Streamlit drops elements that a rerun does
+# not emit again, so this is injected on every run; it is kept small for that reason.
+CHAT_CSS = """
+    <style>
+        .stChatInput { background-color: #1F2937 !important; color: white; }
+        .stChatMessageUser { background-color: #3B82F6 !important; color: white; }
+        .stChatMessageBot { background-color: #10B981 !important; color: white; }
+    </style>
+"""
+
+@st.cache_resource
+def get_api_session():
+    """
+    Create the HTTP session used for all API calls.
+    
+    Streamlit reruns this script on every interaction, so the session is
+    cached as a resource to keep its keep-alive connections across reruns.
+    Idempotent requests are retried once or twice if the API is restarting.
+    """
+    retry = Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_executor():
+    """Create the worker pool for requests that run while the page renders."""
+    return ThreadPoolExecutor(max_workers=2)
+
 # Set up Streamlit page
 st.set_page_config(
     page_title="Stormy - Your Weather Assistant",
@@ -25,14 +72,8 @@ st.set_page_config(
     layout="centered",
 )
 
-# Custom styling for chat bubbles
-st.markdown("""
-    <style>
-        .stChatInput { background-color: #1F2937 !important; color: white; }
-        .stChatMessageUser { background-color: #3B82F6 !important; color: white; }
-        .stChatMessageBot { background-color: #10B981 !important; color: white; }
-    </style>
-""", unsafe_allow_html=True)
+# Apply chat styling
+st.markdown(CHAT_CSS, unsafe_allow_html=True)
 
 # Initialize session state variables
 if "authenticated" not in st.session_state:
@@ -41,19 +82,40 @@ if "username" not in st.session_state:
     st.session_state.username = ""
 if "access_token" not in st.session_state:
     st.session_state.access_token = ""
+if "auth_headers" not in st.session_state:
+    st.session_state.auth_headers = {}
+    st.session_state.auth_headers_json = {}
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_etag" not in st.session_state:
+    st.session_state.history_etag = ""
+
+def error_detail(response):
+    """
+    Get the error detail from an API error response.
+    
+    FastAPI errors carry a JSON {"detail": ...} body, but a proxy or a server
+    that is restarting may answer with plain text or nothing at all.
+    """
+    try:
+        return orjson.loads(response.content).get("detail", "Unknown error")
+    except (orjson.JSONDecodeError, AttributeError):
+        return response.text[:200] or f"HTTP {response.status_code}"
 
 def login(username, password):
     """Authenticate user via API."""
     try:
-        response = requests.post(f"{API_URL}/token", data={"username": username, "password": password})
+        response = get_api_session().post(f"{API_URL}/token", data={"username": username, "password": password}, timeout=API_TIMEOUT)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             st.session_state.access_token = data["access_token"]
+            # Built once here and reused by every authenticated request
+            st.session_state.auth_headers = {"Authorization": f"Bearer {data['access_token']}"}
+            st.session_state.auth_headers_json = {**st.session_state.auth_headers, **JSON_HEADERS}
             st.session_state.username = username
             st.session_state.authenticated = True
-            fetch_chat_history(limit=100)
+            # Fetch the history in the background; chat_page waits for it after drawing the page
+            st.session_state.history_future = start_chat_history_fetch(limit=100)
             return True
         else:
             return False
@@ -64,55 +126,131 @@ def login(username, password):
 def signup(username, password):
     """Register new user via API."""
     try:
-        response = requests.post(f"{API_URL}/signup", json={"username": username, "password": password})
+        response = get_api_session().post(
+            f"{API_URL}/signup",
+            data=orjson.dumps({"username": username, "password": password}),
+            headers=JSON_HEADERS,
+            timeout=API_TIMEOUT,
+        )
         return response.status_code == 201
     except Exception as e:
         st.error(f"Signup error: {e}")
         return False
 
-def logout():
-    """Logout user and clear session state."""
+def clear_session():
+    """Clear the logged-in user's session state."""
     st.session_state.authenticated = False
     st.session_state.username = ""
     st.session_state.access_token = ""
+    st.session_state.auth_headers = {}
+    st.session_state.auth_headers_json = {}
     st.session_state.messages = []
+    st.session_state.history_etag = ""
+    st.session_state.pop("history_future", None)
+    st.session_state.pop("clear_future", None)
+
+def logout():
+    """Logout user, clear session state and restart the script."""
+    clear_session()
     st.rerun()
 
-def send_message(query):
-    """Send user query to API and return response."""
+def stream_message(query):
+    """Send user query to the streaming API and yield the response text as it arrives."""
     if not query.strip():
-        return None
+        return
+
+    # Long pasted queries are worth compressing; short ones aren't
+    body = orjson.dumps({"query": query})
+    headers = st.session_state.auth_headers_json
+    if len(body) > GZIP_MIN_BYTES:
+        body = gzip.compress(body)
+        headers = {**headers, "Content-Encoding": "gzip"}
 
-    headers = {"Authorization": f"Bearer {st.session_state.access_token}", "Content-Type": "application/json"}
-    
     try:
-        response = requests.post(f"{API_URL}/api/chat", headers=headers, json={"query": query})
-        if response.status_code == 200:
-            return response.json()["response"]
-        else:
-            st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
-            if response.status_code == 401:
-                logout()
-            return None
+        with get_api_session().post(
+            f"{API_URL}/api/chat/stream", headers=headers, data=body, stream=True, timeout=API_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                st.error(f"Error: {error_detail(response)}")
+                if response.status_code == 401:
+                    logout()
+                return
+            
+            # Server-Sent Events: each `data:` line holds a JSON-encoded text fragment
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        return
+                    if event == "error":
+                        st.error(f"Error: {orjson.loads(data).get('detail', 'Unknown error')}")
+                        return
+                    yield orjson.loads(data)
+                elif not line:
+                    event = "message"
     except Exception as e:
         st.error(f"Error sending message: {e}")
-        return None
 
-def fetch_chat_history(limit=50):
-    """Retrieve chat history from API."""
+def start_chat_history_fetch(limit=50):
+    """Start retrieving chat history on a worker thread and return the future response."""
+    return get_executor().submit(
+        get_api_session().get,
+        f"{API_URL}/chat-history?limit={limit}",
+        headers=st.session_state.auth_headers,
+        timeout=API_TIMEOUT,
+    )
+
+def coalesce_chunks(chunks, interval=STREAM_FLUSH_INTERVAL):
+    """
+    Join streamed text chunks so the reply is redrawn at most once per interval.
+    
+    The first chunk is passed through straight away, so the time to first
+    token is unchanged; later chunks are buffered until the interval has
+    passed, and whatever is left is flushed when the stream ends.
+    """
+    buffer = []
+    last_flush = float("-inf")
+    for chunk in chunks:
+        buffer.append(chunk)
+        now = time.monotonic()
+        if now - last_flush >= interval:
+            yield "".join(buffer)
+            buffer.clear()
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+def fetch_chat_history(limit=50, pending=None):
+    """
+    Retrieve chat history from API.
+    
+    If `pending` is given, the response of that already started fetch
+    (see start_chat_history_fetch) is used instead of making a new request.
+    """
     if not st.session_state.authenticated:
         return
 
-    headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
+    headers = st.session_state.auth_headers
+    if st.session_state.messages and st.session_state.history_etag:
+        headers = {**headers, "If-None-Match": st.session_state.history_etag}
     
     try:
-        response = requests.get(f"{API_URL}/chat-history?limit={limit}", headers=headers)
+        if pending is not None:
+            response = pending.result()
+        else:
+            response = get_api_session().get(f"{API_URL}/chat-history?limit={limit}", headers=headers, timeout=API_TIMEOUT)
+        if response.status_code == 304:
+            # The messages we already hold are current
+            return True
         if response.status_code == 200:
-            history_data = response.json()
-            st.session_state.messages = history_data["messages"]
+            st.session_state.messages = orjson.loads(response.content)["messages"]
+            st.session_state.history_etag = response.headers.get("ETag", "")
             return True
         else:
-            st.error(f"Error fetching chat history: {response.json().get('detail', 'Unknown error')}")
+            st.error(f"Error fetching chat history: {error_detail(response)}")
             if response.status_code == 401:
                 logout()
             return False
@@ -120,6 +258,26 @@ def fetch_chat_history(limit=50):
         st.error(f"Error fetching chat history: {e}")
         return False
 
+def finish_clear_history(wait=True):
+    """
+    Report the outcome of a chat-history delete running in the background.
+    
+    Args:
+        wait: Whether to block until the delete completes; if False, a delete
+            that is still running is left for a later call
+    """
+    pending = st.session_state.get("clear_future")
+    if pending is None or (not wait and not pending.done()):
+        return
+    del st.session_state.clear_future
+
+    try:
+        response = pending.result()
+        if response.status_code != 200:
+            st.error(f"Error clearing chat history: {error_detail(response)}")
+    except Exception as e:
+        st.error(f"Error clearing chat history: {e}")
+
 # Login Page
 def login_page():
     """Render login interface."""
@@ -149,25 +307,38 @@ def chat_page():
     """Render the chat interface."""
     st.title("🌤️ Chat with Stormy")
 
+    # Surface a failed background delete once it has finished
+    finish_clear_history(wait=False)
+
     # Sidebar
     with st.sidebar:
         st.write(f"Logged in as: **{st.session_state.username}**")
         st.write("Welcome to Stormy, your personal weather assistant!")
-        if st.button("Logout"):
-            logout()
+        # As a callback this runs before the rerun the click triggers, so no second rerun is needed
+        st.button("Logout", on_click=clear_session)
         if st.button("Clear Chat History"):
+            # Clear locally right away and let the server-side delete finish in the background
             st.session_state.messages = []
-            try:
-                headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
-                requests.delete(f"{API_URL}/chat-history", headers=headers)
-                st.success("Chat history cleared!")
-            except Exception as e:
-                st.error(f"Error clearing chat history: {e}")
+            st.session_state.history_etag = ""
+            st.session_state.clear_future = get_executor().submit(
+                get_api_session().delete,
+                f"{API_URL}/chat-history",
+                headers=st.session_state.auth_headers,
+                timeout=API_TIMEOUT,
+            )
+            st.success("Chat history cleared!")
         if st.button("Refresh Chat History"):
+            finish_clear_history()
             with st.spinner("Loading chat history..."):
                 if fetch_chat_history(limit=100):
                     st.success("Chat history refreshed!")
 
+    # Collect the history fetch started at login, now that the rest of the page is drawn
+    pending = st.session_state.pop("history_future", None)
+    if pending is not None:
+        with st.spinner("Loading chat history..."):
+            fetch_chat_history(pending=pending)
+
     # Display chat history with a loading indicator if messages exist
     if st.session_state.messages:
         with st.container():
@@ -179,17 +350,19 @@ def chat_page():
     user_input = st.chat_input("Ask Stormy about the weather:")
     
     if user_input:
+        # The new exchange must not be stored before a pending delete has run
+        finish_clear_history()
+
         # Display user message
         with st.chat_message("user"):
             st.markdown(user_input)
         st.session_state.messages.append({"role": "user", "content": user_input})
 
-        # Get response from API
-        response = send_message(user_input)
+        # Show the response from the API as it is generated
+        with st.chat_message("assistant", avatar="🌤️"):
+            response = st.write_stream(coalesce_chunks(stream_message(user_input)))
 
         if response:
-            with st.chat_message("assistant", avatar="🌤️"):
-                st.markdown(response)
             st.session_state.messages.append({"role": "assistant", "content": response})
 
 # Main Application
@@ -1,10 +1,7 @@
 import os
-from dotenv import load_dotenv
+# Importing weather_agent loads the .env file
 from weather_agent import create_weather_agent
 
-# Load environment variables
-load_dotenv()
-
 def test_conversation_memory():
     # Set a test user ID
     test_user_id = "test_user_1"
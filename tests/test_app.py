@@ -0,0 +1,505 @@
+import asyncio
+import gzip
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import app
+from app import MAX_BATCH_QUERIES, _shared_cache_key
+from memory_handler import MongoDBConversationMemory
+
+
+@pytest.fixture
+def client():
+    """Create a test client for the API without running its startup (no MongoDB needed)."""
+    app.app.state.user_manager = MagicMock()
+    app.app.state.user_manager.user_exists.return_value = True
+    app.auth_cache.clear()
+    return TestClient(app.app)
+
+
+@pytest.fixture
+def auth_headers():
+    """Authorization headers carrying a valid token for 'alice'."""
+    return {"Authorization": f"Bearer {app.create_access_token('alice')}"}
+
+
+class TestSharedCacheKey:
+    """Tests for the cross-user response cache key."""
+
+    def test_paraphrases_share_a_key(self):
+        """Test that case, punctuation and filler words don't change the key."""
+        # Execute
+        key = _shared_cache_key("What's the weather in Paris?")
+
+        # Assert
+        assert key == "weather paris"
+        assert _shared_cache_key("weather in paris please") == key
+
+    def test_word_order_is_kept(self):
+        """Test that comparisons in opposite directions don't share an answer."""
+        # Execute
+        paris_first = _shared_cache_key("Is Paris warmer than Rome?")
+        rome_first = _shared_cache_key("Is Rome warmer than Paris?")
+
+        # Assert
+        assert paris_first != rome_first
+        assert _shared_cache_key("Is Madrid colder than London?") != _shared_cache_key(
+            "Is London colder than Madrid?"
+        )
+
+    def test_contextual_query_is_not_shared(self):
+        """Test that queries referring to the conversation get no shared key."""
+        # Execute / Assert
+        assert _shared_cache_key("What about my city?") is None
+
+
+class TestSharedResponses:
+    """Tests for filling the cross-user response cache."""
+
+    @pytest.fixture
+    def agents(self, monkeypatch):
+        """Stub the user's history-backed agent and the shared history-free executor."""
+        agent = MagicMock()
+        agent.ainvoke = AsyncMock(return_value={"output": "answer from history"})
+        memory = MagicMock()
+        memory.aadd_exchange = AsyncMock()
+        executor = MagicMock()
+        executor.ainvoke = AsyncMock(return_value={"output": "answer without history"})
+        monkeypatch.setattr(app, "get_agent", AsyncMock(return_value=(agent, memory, {})))
+        monkeypatch.setattr(app, "get_agent_executor", AsyncMock(return_value=executor))
+        app.shared_responses.clear()
+        app.recent_chat_responses.clear()
+        yield agent, memory, executor
+        app.shared_responses.clear()
+        app.recent_chat_responses.clear()
+
+    def test_shared_answer_comes_from_run_without_history(self, agents):
+        """Test that a shareable query is answered and cached without the user's history."""
+        # Setup
+        agent, memory, executor = agents
+
+        # Execute
+        output = asyncio.run(app._answer_query("alice", "Weather in Paris on Saturday?"))
+
+        # Assert
+        assert output == "answer without history"
+        executor.ainvoke.assert_awaited_once_with({"input": "Weather in Paris on Saturday?", "chat_history": []})
+        agent.ainvoke.assert_not_called()
+        memory.aadd_exchange.assert_awaited_once_with("Weather in Paris on Saturday?", "answer without history")
+        assert list(app.shared_responses.values()) == ["answer without history"]
+
+    def test_reply_from_history_is_not_shared(self, agents):
+        """Test that a reply from a run with history never lands in the shared cache."""
+        # Setup
+        agent, _, executor = agents
+
+        # Execute
+        output = asyncio.run(app._answer_query("alice", "Will it rain on my trip to Paris?"))
+
+        # Assert
+        assert output == "answer from history"
+        agent.ainvoke.assert_awaited_once()
+        executor.ainvoke.assert_not_called()
+        assert len(app.shared_responses) == 0
+
+
+class TestChatBatch:
+    """Tests for POST /api/chat/batch."""
+
+    @pytest.fixture
+    def agents(self, monkeypatch):
+        """Stub the user's memory and a shared executor whose runs finish in reverse order."""
+        memory = MagicMock()
+        memory.aget_context = AsyncMock(return_value=["earlier turn"])
+        memory.aadd_exchanges = AsyncMock()
+        started = []
+        
+        async def ainvoke(inputs):
+            started.append(inputs["input"])
+            # Each run is shorter than the one started before it, so later queries finish first
+            await asyncio.sleep(0.05 / len(started))
+            return {"output": f"answer to {inputs['input']}"}
+        
+        executor = MagicMock()
+        executor.ainvoke = AsyncMock(side_effect=ainvoke)
+        monkeypatch.setattr(app, "get_agent", AsyncMock(return_value=(MagicMock(), memory, {})))
+        monkeypatch.setattr(app, "get_agent_executor", AsyncMock(return_value=executor))
+        return memory, executor
+
+    def test_responses_and_history_keep_query_order(self, client, auth_headers, agents):
+        """Test that concurrent answers come back, and are stored, in batch order."""
+        # Setup
+        memory, executor = agents
+        queries = ["Weather in Oslo?", "Thanks!", "Forecast for Rome?"]
+
+        # Execute
+        response = client.post("/api/chat/batch", json={"queries": queries}, headers=auth_headers)
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json() == {"responses": [f"answer to {query}" for query in queries]}
+        memory.aget_context.assert_awaited_once()
+        memory.aadd_exchanges.assert_awaited_once_with([
+            ("Weather in Oslo?", "answer to Weather in Oslo?"),
+            ("Forecast for Rome?", "answer to Forecast for Rome?"),
+        ])
+        histories = {call.args[0]["input"]: call.args[0]["chat_history"] for call in executor.ainvoke.await_args_list}
+        assert histories == {"Weather in Oslo?": ["earlier turn"], "Thanks!": [], "Forecast for Rome?": ["earlier turn"]}
+
+    def test_too_many_queries_rejected(self, client, auth_headers, agents):
+        """Test that batches over the query cap are rejected before reaching the agent."""
+        # Setup
+        _, executor = agents
+        queries = [f"Weather in city {i}?" for i in range(MAX_BATCH_QUERIES + 1)]
+
+        # Execute
+        response = client.post("/api/chat/batch", json={"queries": queries}, headers=auth_headers)
+
+        # Assert
+        assert response.status_code == 422
+        executor.ainvoke.assert_not_called()
+
+
+class TestChatStream:
+    """Tests for POST /api/chat/stream."""
+
+    @pytest.fixture
+    def agent(self, monkeypatch):
+        """Stub the user's agent with one that streams two text chunks."""
+        agent = MagicMock()
+        
+        async def astream_events(inputs, config=None, version="v2"):
+            agent.runs += 1
+            for text in ("Sunny in ", "Oslo."):
+                yield {"event": "on_chat_model_stream", "parent_ids": ["run"], "data": {"chunk": MagicMock(content=text)}}
+            yield {"event": "on_chain_end", "parent_ids": [], "data": {"output": {"output": "Sunny in Oslo."}}}
+        
+        agent.runs = 0
+        agent.astream_events = astream_events
+        monkeypatch.setattr(app, "get_agent", AsyncMock(return_value=(agent, MagicMock(), {})))
+        app.recent_chat_responses.clear()
+        app.shared_responses.clear()
+        yield agent
+        app.recent_chat_responses.clear()
+        app.shared_responses.clear()
+
+    def test_stream_fills_recent_answers(self, client, auth_headers, agent):
+        """Test that a streamed answer is replayed as one event for a repeated query."""
+        # Setup
+        body = {"query": "Will it rain on my walk?"}
+
+        # Execute
+        first = client.post("/api/chat/stream", json=body, headers=auth_headers)
+        second = client.post("/api/chat/stream", json=body, headers=auth_headers)
+
+        # Assert
+        assert first.text == 'data: "Sunny in "\n\ndata: "Oslo."\n\ndata: [DONE]\n\n'
+        assert second.text == 'data: "Sunny in Oslo."\n\ndata: [DONE]\n\n'
+        assert agent.runs == 1
+        assert app.recent_chat_responses[("alice", body["query"])] == "Sunny in Oslo."
+        assert ("alice", body["query"]) not in app._chat_inflight
+
+    def test_recent_answer_replayed_without_agent(self, client, auth_headers, agent):
+        """Test that an answer given moments ago is sent without running the agent."""
+        # Setup
+        app.recent_chat_responses[("alice", "Weather in Oslo?")] = "Cloudy."
+
+        # Execute
+        response = client.post("/api/chat/stream", json={"query": "Weather in Oslo?"}, headers=auth_headers)
+
+        # Assert
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == 'data: "Cloudy."\n\ndata: [DONE]\n\n'
+        assert agent.runs == 0
+
+    def test_duplicate_joins_stream_in_flight(self, client, auth_headers, agent):
+        """Test that an identical query sent mid-stream waits for that answer instead of running again."""
+        # Setup
+        started, release = asyncio.Event(), asyncio.Event()
+        original = agent.astream_events
+        
+        async def slow_astream_events(*args, **kwargs):
+            async for event in original(*args, **kwargs):
+                yield event
+                started.set()
+                await release.wait()
+        
+        agent.astream_events = slow_astream_events
+        body = {"query": "Will it rain on my walk?"}
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://test") as http:
+                first = asyncio.create_task(http.post("/api/chat/stream", json=body, headers=auth_headers))
+                await started.wait()
+                second = asyncio.create_task(http.post("/api/chat/stream", json=body, headers=auth_headers))
+                await asyncio.sleep(0.05)
+                release.set()
+                return await first, await second
+
+        # Execute
+        first, second = asyncio.run(run())
+
+        # Assert
+        assert first.text.endswith("data: [DONE]\n\n")
+        assert second.text == 'data: "Sunny in Oslo."\n\ndata: [DONE]\n\n'
+        assert agent.runs == 1
+
+
+class TestAuthentication:
+    """Tests for JWT issue and verification."""
+
+    def test_token_carries_user_and_expiry(self):
+        """Test that issued tokens name the user and expire after the configured time."""
+        # Execute
+        token = app.create_access_token("alice")
+
+        # Assert
+        payload = jwt.decode(token, app.JWT_SECRET_KEY, algorithms=[app.JWT_ALGORITHM])
+        assert payload["sub"] == "alice"
+        expected_expiry = datetime.now(timezone.utc) + timedelta(minutes=app.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+        assert abs(payload["exp"] - expected_expiry.timestamp()) < 5
+
+    def test_valid_token_checks_user_once(self, client, auth_headers):
+        """Test that a valid token is accepted and the user lookup is cached."""
+        # Execute
+        first = client.get("/internal/agent-cache", headers=auth_headers)
+        second = client.get("/internal/agent-cache", headers=auth_headers)
+
+        # Assert
+        assert first.status_code == 200
+        assert second.status_code == 200
+        app.app.state.user_manager.user_exists.assert_called_once_with("alice")
+
+    def test_expired_token_rejected(self, client):
+        """Test that a token past its expiry is rejected."""
+        # Setup
+        expired = datetime.now(timezone.utc) - timedelta(minutes=1)
+        token = jwt.encode({"sub": "alice", "exp": expired}, app.JWT_SECRET_KEY, algorithm=app.JWT_ALGORITHM)
+
+        # Execute
+        response = client.get("/internal/agent-cache", headers={"Authorization": f"Bearer {token}"})
+
+        # Assert
+        assert response.status_code == 401
+        assert response.json() == {"detail": "Invalid authentication credentials"}
+
+    def test_token_signed_with_other_key_rejected(self, client):
+        """Test that a token not signed with the server's key is rejected."""
+        # Setup
+        expiry = datetime.now(timezone.utc) + timedelta(minutes=5)
+        token = jwt.encode({"sub": "alice", "exp": expiry}, "not-the-key", algorithm=app.JWT_ALGORITHM)
+
+        # Execute
+        response = client.get("/internal/agent-cache", headers={"Authorization": f"Bearer {token}"})
+
+        # Assert
+        assert response.status_code == 401
+
+    def test_deleted_user_rejected(self, client, auth_headers):
+        """Test that a valid token for a user who no longer exists is rejected."""
+        # Setup
+        app.app.state.user_manager.user_exists.return_value = False
+
+        # Execute
+        response = client.get("/internal/agent-cache", headers=auth_headers)
+
+        # Assert
+        assert response.status_code == 401
+
+
+class TestChatQueryDecoding:
+    """Tests for decoding plain and gzip-encoded chat query bodies."""
+
+    @pytest.fixture(autouse=True)
+    def echo(self, monkeypatch):
+        """Answer every query by echoing it."""
+        async def answer_query(user_id, query):
+            return f"echo: {query}"
+        
+        monkeypatch.setattr(app, "_answer_query", answer_query)
+
+    def post(self, client, auth_headers, body, encoding=None):
+        """Post a raw chat query body, optionally with a Content-Encoding."""
+        headers = {**auth_headers, "Content-Type": "application/json"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return client.post("/api/chat", content=body, headers=headers)
+
+    def test_plain_body(self, client, auth_headers):
+        """Test that an unencoded body is decoded."""
+        # Execute
+        response = self.post(client, auth_headers, b'{"query": "Weather in Oslo?"}')
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json() == {"response": "echo: Weather in Oslo?"}
+
+    def test_gzip_body(self, client, auth_headers):
+        """Test that a gzip-encoded body is inflated before decoding."""
+        # Execute
+        response = self.post(client, auth_headers, gzip.compress(b'{"query": "Weather in Oslo?"}'), "gzip")
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json() == {"response": "echo: Weather in Oslo?"}
+
+    def test_gzip_body_at_size_limit(self, client, auth_headers):
+        """Test that a body inflating to exactly the size limit is accepted."""
+        # Setup
+        padding = app.MAX_CHAT_BODY_BYTES - len(b'{"query": ""}')
+        body = b'{"query": "' + b"a" * padding + b'"}'
+
+        # Execute
+        response = self.post(client, auth_headers, gzip.compress(body), "gzip")
+
+        # Assert
+        assert response.status_code == 200
+
+    def test_gzip_body_over_size_limit(self, client, auth_headers):
+        """Test that a body inflating past the size limit is rejected."""
+        # Setup
+        padding = app.MAX_CHAT_BODY_BYTES - len(b'{"query": ""}') + 1
+        body = b'{"query": "' + b"a" * padding + b'"}'
+
+        # Execute
+        response = self.post(client, auth_headers, gzip.compress(body), "gzip")
+
+        # Assert
+        assert response.status_code == 413
+
+    def test_corrupt_gzip_body(self, client, auth_headers):
+        """Test that a body that isn't valid gzip is rejected."""
+        # Execute
+        response = self.post(client, auth_headers, b"not gzip at all", "gzip")
+
+        # Assert
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Invalid gzip body")
+
+    def test_unsupported_encoding(self, client, auth_headers):
+        """Test that encodings other than gzip are refused."""
+        # Execute
+        response = self.post(client, auth_headers, b'{"query": "Weather in Oslo?"}', "br")
+
+        # Assert
+        assert response.status_code == 415
+
+    def test_invalid_json(self, client, auth_headers):
+        """Test that a body not matching the query schema is rejected."""
+        # Execute
+        response = self.post(client, auth_headers, b'{"question": "Weather in Oslo?"}')
+
+        # Assert
+        assert response.status_code == 422
+
+
+def _stored(message_type, content):
+    """A stored history item as returned by WindowedMongoDBChatMessageHistory.apage."""
+    return ObjectId(), {"type": message_type, "data": {"content": content}}
+
+
+class TestChatHistory:
+    """Tests for GET /chat-history."""
+
+    @pytest.fixture
+    def history(self, monkeypatch):
+        """Stub the user's stored history page lookups behind a real memory."""
+        memory = MongoDBConversationMemory.__new__(MongoDBConversationMemory)
+        memory.user_id = "alice"
+        memory.message_history = MagicMock()
+        memory.message_history.apage = AsyncMock(return_value=[])
+        monkeypatch.setattr(app, "get_agent", AsyncMock(return_value=(MagicMock(), memory, {})))
+        return memory.message_history
+
+    def test_first_page(self, client, auth_headers, history):
+        """Test that the latest messages are returned with the last one's ID as cursor."""
+        # Setup
+        items = [_stored("human", "Weather in Oslo?"), _stored("ai", "Sunny.")]
+        history.apage.return_value = items
+
+        # Execute
+        response = client.get("/chat-history", headers=auth_headers)
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json() == {
+            "messages": [
+                {"role": "user", "content": "Weather in Oslo?"},
+                {"role": "assistant", "content": "Sunny."},
+            ],
+            "next_cursor": str(items[-1][0]),
+        }
+        history.apage.assert_awaited_once_with(50, None)
+
+    def test_next_page_after_cursor(self, client, auth_headers, history):
+        """Test that after_id reads the page stored after the cursor."""
+        # Setup
+        cursor = ObjectId()
+        items = [_stored("human", "And tomorrow?")]
+        history.apage.return_value = items
+
+        # Execute
+        response = client.get("/chat-history", params={"limit": 10, "after_id": str(cursor)}, headers=auth_headers)
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json()["next_cursor"] == str(items[0][0])
+        history.apage.assert_awaited_once_with(10, cursor)
+
+    def test_empty_page_keeps_cursor(self, client, auth_headers, history):
+        """Test that a page with no newer messages hands back the same cursor."""
+        # Setup
+        cursor = str(ObjectId())
+
+        # Execute
+        response = client.get("/chat-history", params={"after_id": cursor}, headers=auth_headers)
+
+        # Assert
+        assert response.json() == {"messages": [], "next_cursor": cursor}
+
+    def test_unchanged_page_not_modified(self, client, auth_headers, history):
+        """Test that sending back the page's ETag gets an empty 304."""
+        # Setup
+        history.apage.return_value = [_stored("human", "Weather in Oslo?")]
+        first = client.get("/chat-history", headers=auth_headers)
+        etag = first.headers["etag"]
+
+        # Execute
+        second = client.get("/chat-history", headers={**auth_headers, "If-None-Match": etag})
+
+        # Assert
+        assert first.headers["cache-control"] == "private, no-cache"
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+    def test_changed_page_sent_again(self, client, auth_headers, history):
+        """Test that a stale ETag gets the new page with a new ETag."""
+        # Setup
+        history.apage.return_value = [_stored("human", "Weather in Oslo?")]
+        etag = client.get("/chat-history", headers=auth_headers).headers["etag"]
+        history.apage.return_value = [_stored("human", "Weather in Oslo?"), _stored("ai", "Sunny.")]
+
+        # Execute
+        response = client.get("/chat-history", headers={**auth_headers, "If-None-Match": etag})
+
+        # Assert
+        assert response.status_code == 200
+        assert len(response.json()["messages"]) == 2
+        assert response.headers["etag"] != etag
+
+    def test_invalid_cursor(self, client, auth_headers, history):
+        """Test that a malformed after_id is rejected without reading the history."""
+        # Execute
+        response = client.get("/chat-history", params={"after_id": "not-an-id"}, headers=auth_headers)
+
+        # Assert
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid after_id cursor"}
+        history.apage.assert_not_called()
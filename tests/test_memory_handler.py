@@ -0,0 +1,107 @@
+from unittest.mock import MagicMock
+
+from bson import ObjectId
+from langchain_core.messages import AIMessage, HumanMessage, messages_from_dict
+from langchain_core.runnables import RunnableLambda
+from pymongo import ASCENDING
+
+from memory_handler import (
+    MongoDBConversationMemory,
+    WindowedMongoDBChatMessageHistory,
+    compact_message_dict,
+    needs_history,
+)
+
+
+class TestNeedsHistory:
+    """Tests for the small-talk gate on conversation history."""
+
+    def test_small_talk_skips_history(self):
+        """Test that greetings and thanks are answered without history."""
+        # Execute / Assert
+        assert not needs_history("Thanks!")
+        assert not needs_history("hello there")
+        assert not needs_history("  ok. ")
+        assert not needs_history("Good morning!")
+
+    def test_questions_use_history(self):
+        """Test that weather questions and short follow-ups keep their history."""
+        # Execute / Assert
+        assert needs_history("and tomorrow?")
+        assert needs_history("What about Paris")
+        assert needs_history("hey, what's the weather in London?")
+        assert needs_history("thanks, and the forecast for Rome?")
+
+
+class TestCompactMessageDict:
+    """Tests for the stored message format."""
+
+    def test_round_trip(self):
+        """Test that compact dicts load back as the original messages."""
+        # Setup
+        messages = [HumanMessage(content="Weather in Paris?"), AIMessage(content="Sunny, 21°C")]
+
+        # Execute
+        loaded = messages_from_dict([compact_message_dict(message) for message in messages])
+
+        # Assert
+        assert loaded == messages
+
+    def test_empty_fields_dropped(self):
+        """Test that default-valued fields aren't stored."""
+        # Execute
+        result = compact_message_dict(AIMessage(content="Sunny"))
+
+        # Assert
+        assert result == {"type": "ai", "data": {"content": "Sunny"}}
+
+
+class TestCreateRunnableWithHistory:
+    """Tests for wrapping a runnable with the user's history."""
+
+    def test_wrapper_is_reused(self):
+        """Test that wrapping the same runnable twice returns the same wrapper."""
+        # Setup
+        memory = MongoDBConversationMemory.__new__(MongoDBConversationMemory)
+        memory.user_id = "test_user"
+        memory._wrapped = memory._wrapped_for = None
+        runnable = RunnableLambda(lambda inputs: {"output": inputs["input"]})
+
+        # Execute
+        first = memory.create_runnable_with_history(runnable)
+        second = memory.create_runnable_with_history(runnable)
+        other = memory.create_runnable_with_history(RunnableLambda(lambda inputs: inputs))
+
+        # Assert
+        assert first is second
+        assert other is not first
+
+
+class TestHistoryPage:
+    """Tests for reading a page of stored messages after a cursor."""
+
+    def test_page_after_cursor_scans_forward(self):
+        """Test that a cursor page reads the next messages in storage order."""
+        # Setup
+        history = WindowedMongoDBChatMessageHistory.__new__(WindowedMongoDBChatMessageHistory)
+        history.session_id_key, history.session_id, history.history_key = "SessionId", "alice", "History"
+        history.collection = MagicMock()
+        cursor = ObjectId()
+        ids = [ObjectId(), ObjectId()]
+        find = history.collection.find.return_value
+        find.sort.return_value.limit.return_value = [
+            {"_id": ids[0], "History": '{"type": "human", "data": {"content": "And tomorrow?"}}'},
+            {"_id": ids[1], "History": '{"type": "ai", "data": {"content": "Rain."}}'},
+        ]
+
+        # Execute
+        items = history.page(2, cursor)
+
+        # Assert
+        history.collection.find.assert_called_once_with(
+            {"SessionId": "alice", "_id": {"$gt": cursor}}, {"History": 1}
+        )
+        find.sort.assert_called_once_with("_id", ASCENDING)
+        find.sort.return_value.limit.assert_called_once_with(2)
+        assert [item_id for item_id, _ in items] == ids
+        assert items[1][1]["data"]["content"] == "Rain."
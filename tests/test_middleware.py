@@ -0,0 +1,154 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middleware import ASGICORSMiddleware, AuthMiddleware, CORSAuthMiddleware
+
+ALLOWED_ORIGIN = "http://localhost:8501"
+
+
+def _homepage(request):
+    return PlainTextResponse("ok")
+
+
+def _whoami(request):
+    return PlainTextResponse(request.scope["state"]["user"])
+
+
+async def _authenticate(token):
+    return "alice" if token == "good-token" else None
+
+
+class TestASGICORSMiddleware:
+    """Tests for the pure ASGI CORS middleware."""
+
+    @pytest.fixture
+    def client(self):
+        """Create a test client for a minimal app wrapped in the middleware."""
+        app = Starlette(routes=[Route("/", _homepage, methods=["GET", "POST"])])
+        app.add_middleware(ASGICORSMiddleware, allow_origins=[ALLOWED_ORIGIN])
+        return TestClient(app)
+
+    def test_simple_request_allowed_origin(self, client):
+        """Test that responses to allowed origins carry the CORS headers."""
+        response = client.get("/", headers={"Origin": ALLOWED_ORIGIN})
+
+        assert response.status_code == 200
+        assert response.text == "ok"
+        assert response.headers["access-control-allow-origin"] == ALLOWED_ORIGIN
+        assert response.headers["access-control-allow-credentials"] == "true"
+
+    def test_simple_request_disallowed_origin(self, client):
+        """Test that responses to other origins get no CORS headers."""
+        response = client.get("/", headers={"Origin": "http://evil.example"})
+
+        assert response.status_code == 200
+        assert "access-control-allow-origin" not in response.headers
+
+    def test_preflight_allowed(self, client):
+        """Test that a valid preflight is answered without reaching the app."""
+        response = client.options("/", headers={
+            "Origin": ALLOWED_ORIGIN,
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "Authorization, Content-Type",
+        })
+
+        assert response.status_code == 204
+        assert response.headers["access-control-allow-origin"] == ALLOWED_ORIGIN
+        assert "POST" in response.headers["access-control-allow-methods"]
+
+    def test_preflight_disallowed_header(self, client):
+        """Test that a preflight asking for a non-allowed header is rejected."""
+        response = client.options("/", headers={
+            "Origin": ALLOWED_ORIGIN,
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "x-custom",
+        })
+
+        assert response.status_code == 400
+
+
+class TestAuthMiddleware:
+    """Tests for the pure ASGI authentication middleware."""
+
+    @pytest.fixture
+    def client(self):
+        """Create a test client for a minimal app wrapped in the middleware."""
+        app = Starlette(routes=[Route("/", _homepage), Route("/me", _whoami)])
+        app.add_middleware(AuthMiddleware, authenticate=_authenticate, public_paths=["/"])
+        return TestClient(app)
+
+    def test_public_path_needs_no_token(self, client):
+        """Test that public paths are reachable without credentials."""
+        response = client.get("/")
+
+        assert response.status_code == 200
+
+    def test_missing_token(self, client):
+        """Test that protected paths reject requests without a bearer token."""
+        response = client.get("/me")
+
+        assert response.status_code == 401
+        assert response.json() == {"detail": "Not authenticated"}
+        assert response.headers["www-authenticate"] == "Bearer"
+
+    def test_invalid_token(self, client):
+        """Test that protected paths reject tokens the authenticator refuses."""
+        response = client.get("/me", headers={"Authorization": "Bearer bad-token"})
+
+        assert response.status_code == 401
+        assert response.json() == {"detail": "Invalid authentication credentials"}
+
+    def test_valid_token_sets_user(self, client):
+        """Test that the authenticated user is available to the endpoint."""
+        response = client.get("/me", headers={"Authorization": "Bearer good-token"})
+
+        assert response.status_code == 200
+        assert response.text == "alice"
+
+
+class TestCORSAuthMiddleware:
+    """Tests for the combined CORS and authentication middleware."""
+
+    @pytest.fixture
+    def client(self):
+        """Create a test client for a minimal app wrapped in the middleware."""
+        app = Starlette(routes=[Route("/", _homepage), Route("/me", _whoami)])
+        app.add_middleware(
+            CORSAuthMiddleware,
+            authenticate=_authenticate,
+            public_paths=["/"],
+            allow_origins=[ALLOWED_ORIGIN],
+        )
+        return TestClient(app)
+
+    def test_preflight_needs_no_token(self, client):
+        """Test that preflights to protected paths are answered without credentials."""
+        response = client.options("/me", headers={
+            "Origin": ALLOWED_ORIGIN,
+            "Access-Control-Request-Method": "GET",
+            "Access-Control-Request-Headers": "Authorization",
+        })
+
+        assert response.status_code == 204
+        assert response.headers["access-control-allow-origin"] == ALLOWED_ORIGIN
+
+    def test_rejection_carries_cors_headers(self, client):
+        """Test that 401 responses to allowed origins are readable by the browser."""
+        response = client.get("/me", headers={"Origin": ALLOWED_ORIGIN})
+
+        assert response.status_code == 401
+        assert response.headers["access-control-allow-origin"] == ALLOWED_ORIGIN
+
+    def test_valid_token_sets_user(self, client):
+        """Test that authenticated cross-origin requests reach the endpoint."""
+        response = client.get("/me", headers={
+            "Origin": ALLOWED_ORIGIN,
+            "Authorization": "Bearer good-token",
+        })
+
+        assert response.status_code == 200
+        assert response.text == "alice"
+        assert response.headers["access-control-allow-origin"] == ALLOWED_ORIGIN
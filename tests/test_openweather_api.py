@@ -1,5 +1,8 @@
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
+import httpx
+import orjson
 import requests
 from openweather_api import OpenWeather
 
@@ -11,15 +14,15 @@ class TestOpenWeatherAPI:
         """Create an instance of the OpenWeather client."""
         return OpenWeather()
     
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
     def test_get_geolocation_success(self, mock_get, openweather):
         """Test getting geolocation with successful API response."""
         # Setup
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = [
+        mock_response.content = orjson.dumps([
             {"name": "London", "lat": 51.5074, "lon": -0.1278, "country": "GB"}
-        ]
+        ])
         mock_get.return_value = mock_response
         
         # Execute
@@ -29,13 +32,13 @@ class TestOpenWeatherAPI:
         assert result == [{"name": "London", "lat": 51.5074, "lon": -0.1278, "country": "GB"}]
         mock_get.assert_called_once()
         
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
     def test_get_geolocation_not_found(self, mock_get, openweather):
         """Test getting geolocation with no results."""
         # Setup
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = []
+        mock_response.content = orjson.dumps([])
         mock_get.return_value = mock_response
         
         # Execute
@@ -45,7 +48,7 @@ class TestOpenWeatherAPI:
         assert result == []
         mock_get.assert_called_once()
         
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
     def test_get_geolocation_api_error(self, mock_get, openweather):
         """Test getting geolocation with API error."""
         # Setup
@@ -58,19 +61,51 @@ class TestOpenWeatherAPI:
         assert result == []
         mock_get.assert_called_once()
         
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
+    def test_get_geolocation_cached(self, mock_get, openweather):
+        """Test that repeated geolocation lookups for a city reuse the first response."""
+        # Setup
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = orjson.dumps([
+            {"name": "London", "lat": 51.5074, "lon": -0.1278, "country": "GB"}
+        ])
+        mock_get.return_value = mock_response
+        
+        # Execute
+        first = openweather.get_geolocation("London", "GB")
+        second = openweather.get_geolocation("london", "gb")
+        
+        # Assert
+        assert first == second
+        mock_get.assert_called_once()
+        
+    @patch("openweather_api.requests.Session.get")
+    def test_get_geolocation_failure_not_cached(self, mock_get, openweather):
+        """Test that failed geolocation lookups are retried on the next call."""
+        # Setup
+        mock_get.side_effect = requests.RequestException("API error")
+        
+        # Execute
+        openweather.get_geolocation("London")
+        openweather.get_geolocation("London")
+        
+        # Assert
+        assert mock_get.call_count == 2
+        
+    @patch("openweather_api.requests.Session.get")
     def test_get_current_weather_success(self, mock_get, openweather):
         """Test getting current weather with successful API response."""
         # Setup
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
+        mock_response.content = orjson.dumps({
             "main": {"temp": 15.5, "feels_like": 14.8, "humidity": 76},
             "weather": [{"main": "Clouds", "description": "scattered clouds"}],
             "wind": {"speed": 3.6},
             "dt": 1646318698,
             "name": "London"
-        }
+        })
         mock_get.return_value = mock_response
         
         # Execute
@@ -81,7 +116,42 @@ class TestOpenWeatherAPI:
         assert result["weather"][0]["description"] == "scattered clouds"
         mock_get.assert_called_once()
         
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
+    def test_get_current_weather_cached_for_nearby_coordinates(self, mock_get, openweather):
+        """Test that lookups for practically the same coordinates share a response."""
+        # Setup
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = orjson.dumps({"main": {"temp": 15.5}})
+        mock_get.return_value = mock_response
+        
+        # Execute
+        first = openweather.get_current_weather(51.5074, -0.1278)
+        second = openweather.get_current_weather(51.50741, -0.12779)
+        
+        # Assert
+        assert first == second
+        mock_get.assert_called_once()
+        
+    @patch("openweather_api.requests.Session.get")
+    def test_format_current_weather_reused_with_cached_response(self, mock_get, openweather):
+        """Test that a reply formatted from a cached response is reused for the same place."""
+        # Setup
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = orjson.dumps({"main": {"temp": 15.5}})
+        mock_get.return_value = mock_response
+        weather_data = openweather.get_current_weather(51.5074, -0.1278)
+        
+        # Execute
+        first = openweather.format_current_weather(weather_data, "London", "GB")
+        second = openweather.format_current_weather(weather_data, " london ", "gb")
+        
+        # Assert
+        assert second is first
+        assert weather_data.replies == {("london", "gb"): first}
+        
+    @patch("openweather_api.requests.Session.get")
     def test_get_current_weather_api_error(self, mock_get, openweather):
         """Test getting current weather with API error."""
         # Setup
@@ -94,13 +164,13 @@ class TestOpenWeatherAPI:
         assert result is None
         mock_get.assert_called_once()
         
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
     def test_get_weather_forecast_success(self, mock_get, openweather):
         """Test getting weather forecast with successful API response."""
         # Setup
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
+        mock_response.content = orjson.dumps({
             "list": [
                 {
                     "dt": 1646319600,
@@ -118,7 +188,7 @@ class TestOpenWeatherAPI:
                 }
             ],
             "city": {"name": "London", "country": "GB"}
-        }
+        })
         mock_get.return_value = mock_response
         
         # Execute
@@ -130,7 +200,7 @@ class TestOpenWeatherAPI:
         assert result["list"][1]["weather"][0]["main"] == "Rain"
         mock_get.assert_called_once()
         
-    @patch("openweather_api.requests.get")
+    @patch("openweather_api.requests.Session.get")
     def test_get_weather_forecast_api_error(self, mock_get, openweather):
         """Test getting weather forecast with API error."""
         # Setup
@@ -141,4 +211,192 @@ class TestOpenWeatherAPI:
         
         # Assert
         assert result is None
-        mock_get.assert_called_once() 
\ No newline at end of file
+        mock_get.assert_called_once()
+        
+    def test_session_reuses_connections_and_retries(self, openweather):
+        """Test that the blocking calls share a pooled session that retries server errors."""
+        # Execute
+        adapter = openweather.session.get_adapter("https://api.openweathermap.org")
+        
+        # Assert
+        assert adapter.max_retries.total == 2
+        assert 503 in adapter.max_retries.status_forcelist
+        
+    def test_aget_current_weather_uses_shared_client(self, openweather):
+        """Test that the async current weather call goes through the injected HTTP client."""
+        # Setup
+        requests_seen = []
+        
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json={"main": {"temp": 15.5}})
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                openweather.http_client = client
+                return await openweather.aget_current_weather(51.5074, -0.1278)
+        
+        # Execute
+        with patch.object(OpenWeather, "BASE_URL", "https://api.example.com/weather"):
+            result = asyncio.run(run())
+        
+        # Assert
+        assert result["main"]["temp"] == 15.5
+        assert len(requests_seen) == 1
+        assert requests_seen[0].url.params["lat"] == "51.5074"
+        
+    def test_aget_geolocation_concurrent_calls_share_request(self, openweather):
+        """Test that concurrent async lookups for the same city issue one HTTP request."""
+        # Setup
+        requests_seen = []
+        
+        async def handler(request):
+            requests_seen.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=[{"name": "London", "lat": 51.5074, "lon": -0.1278}])
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                openweather.http_client = client
+                return await asyncio.gather(
+                    openweather.aget_geolocation("London"),
+                    openweather.aget_geolocation("London"),
+                )
+        
+        # Execute
+        with patch.object(OpenWeather, "GEO_URL", "https://api.example.com/geo"):
+            first, second = asyncio.run(run())
+        
+        # Assert
+        assert first == second
+        assert len(requests_seen) == 1
+        
+    def test_aget_forecast_api_error(self, openweather):
+        """Test the async forecast call with an HTTP error response."""
+        # Setup
+        async def run():
+            transport = httpx.MockTransport(lambda request: httpx.Response(500))
+            async with httpx.AsyncClient(transport=transport) as client:
+                openweather.http_client = client
+                return await openweather.aget_forecast(51.5074, -0.1278)
+        
+        # Execute
+        with patch.object(OpenWeather, "FORECAST_URL", "https://api.example.com/forecast"):
+            result = asyncio.run(run())
+        
+        # Assert
+        assert result is None
+        
+    def test_aget_weather_bundle_overlaps_requests(self, openweather):
+        """Test that the bundle fetches current weather and forecast concurrently."""
+        # Setup
+        in_flight = []
+        overlapped = []
+        
+        async def handler(request):
+            in_flight.append(request)
+            await asyncio.sleep(0.01)
+            overlapped.append(len(in_flight) == 2)
+            if request.url.path == "/forecast":
+                return httpx.Response(200, json={"list": []})
+            return httpx.Response(200, json={"main": {"temp": 15.5}})
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                openweather.http_client = client
+                return await openweather.aget_weather_bundle(51.5074, -0.1278)
+        
+        # Execute
+        with patch.object(OpenWeather, "BASE_URL", "https://api.example.com/weather"), \
+                patch.object(OpenWeather, "FORECAST_URL", "https://api.example.com/forecast"):
+            current, forecast = asyncio.run(run())
+        
+        # Assert
+        assert current == {"main": {"temp": 15.5}}
+        assert forecast == {"list": []}
+        assert all(overlapped)
+        
+    def test_async_requests_capped(self, openweather):
+        """Test that no more async requests run at once than there are request slots."""
+        # Setup
+        in_flight = []
+        most_in_flight = []
+        openweather._request_slots = asyncio.Semaphore(2)
+        
+        async def handler(request):
+            in_flight.append(request)
+            most_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(request)
+            return httpx.Response(200, json={"main": {"temp": 15.5}})
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                openweather.http_client = client
+                return await asyncio.gather(*(
+                    openweather.aget_current_weather(51.5 + i, -0.1278) for i in range(5)
+                ))
+        
+        # Execute
+        with patch.object(OpenWeather, "BASE_URL", "https://api.example.com/weather"):
+            results = asyncio.run(run())
+        
+        # Assert
+        assert all(result == {"main": {"temp": 15.5}} for result in results)
+        assert max(most_in_flight) == 2
+        
+    def test_parse_forecast_flattens_entries(self, openweather):
+        """Test that forecast slots are flattened, with missing rain and snow as 0."""
+        # Setup
+        forecast_data = {"list": [{
+            "dt": 1646319600,
+            "main": {"temp": 15.5, "feels_like": 14.8, "humidity": 76},
+            "weather": [{"main": "Rain", "description": "light rain"}],
+            "wind": {"speed": 3.6, "deg": 200},
+            "rain": {"3h": 1.2},
+        }]}
+        
+        # Execute
+        entries = openweather.parse_forecast(forecast_data)
+        
+        # Assert
+        assert len(entries) == 1
+        assert entries[0].temp == 15.5
+        assert entries[0].main == "Rain"
+        assert entries[0].rain == 1.2
+        assert entries[0].snow == 0
+        
+    def test_format_current_weather_partial_payload(self, openweather):
+        """Test that missing fields are shown as N/A instead of failing the report."""
+        # Execute
+        result = openweather.format_current_weather({"main": {"temp": 3.2}}, "Oslo", "no")
+        
+        # Assert
+        assert "Current Weather for Oslo, NO" in result
+        assert "**Temperature:** 3.2°C" in result
+        assert "**Conditions:** N/A" in result
+        assert "Error" not in result
+        
+    def test_aget_geolocations_keeps_order_and_dedupes(self, openweather):
+        """Test that multi-city lookups return results in order with one request per city."""
+        # Setup
+        cities_requested = []
+        
+        async def handler(request):
+            city = request.url.params["q"]
+            cities_requested.append(city)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=[{"name": city, "lat": 1.0, "lon": 2.0}])
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                openweather.http_client = client
+                return await openweather.aget_geolocations(["Paris", "Rome", "Paris"])
+        
+        # Execute
+        with patch.object(OpenWeather, "GEO_URL", "https://api.example.com/geo"):
+            results = asyncio.run(run())
+        
+        # Assert
+        assert [result[0]["name"] for result in results] == ["Paris", "Rome", "Paris"]
+        assert sorted(cities_requested) == ["Paris", "Rome"]
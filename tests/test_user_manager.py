@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from user_manager import UserManager
+
+
+class TestUserManager:
+    """Tests for user authentication and lookups."""
+
+    @pytest.fixture
+    def user_manager(self):
+        """Create a UserManager with a mocked MongoDB client."""
+        return UserManager(database_name="test_db", client=MagicMock())
+
+    def test_authenticate_user(self, user_manager):
+        """Test that only the stored password authenticates, reading just the hash fields."""
+        # Setup
+        password_data = user_manager._hash_password("s3cret")
+        user_manager.users.find_one.return_value = {
+            "password_hash": password_data["hash"],
+            "salt": password_data["salt"],
+        }
+
+        # Execute / Assert
+        assert user_manager.authenticate_user("alice", "s3cret")
+        assert not user_manager.authenticate_user("alice", "wrong")
+        user_manager.users.find_one.assert_called_with(
+            {"username": "alice"}, {"salt": 1, "password_hash": 1, "_id": 0}
+        )
+
+    def test_authenticate_unknown_user(self, user_manager):
+        """Test that unknown users don't authenticate."""
+        # Setup
+        user_manager.users.find_one.return_value = None
+
+        # Execute / Assert
+        assert not user_manager.authenticate_user("bob", "s3cret")
+
+    def test_user_exists(self, user_manager):
+        """Test that user_exists counts at most one matching document."""
+        # Setup
+        user_manager.users.count_documents.return_value = 1
+
+        # Execute
+        exists = user_manager.user_exists("alice")
+
+        # Assert
+        assert exists
+        user_manager.users.count_documents.assert_called_once_with({"username": "alice"}, limit=1)
+
+    def test_register_existing_user(self, user_manager):
+        """Test that an existing username is not registered again."""
+        # Setup
+        user_manager.users.count_documents.return_value = 1
+
+        # Execute
+        registered = user_manager.register_user("alice", "s3cret")
+
+        # Assert
+        assert not registered
+        user_manager.users.insert_one.assert_not_called()
@@ -2,10 +2,37 @@
 Tests for weather formatting functions without making API calls.
 """
 
+import bisect
 import pytest
 import os
 from datetime import datetime
 
+# Beaufort scale: upper bounds in m/s and the description of each band
+WIND_THRESHOLDS = (0.5, 1.5, 3.3, 5.5, 7.9, 10.7, 13.8, 17.1, 20.7, 24.4, 28.4, 32.6)
+WIND_LABELS = (
+    "Calm", "Light air", "Light breeze", "Gentle breeze", "Moderate breeze", "Fresh breeze",
+    "Strong breeze", "High wind", "Gale", "Strong gale", "Storm", "Violent storm", "Hurricane force",
+)
+
+# Icon for each OpenWeather condition group
+WEATHER_ICONS = {
+    "Clear": "☀️",
+    "Clouds": "☁️",
+    "Rain": "🌧️",
+    "Drizzle": "🌦️",
+    "Thunderstorm": "⛈️",
+    "Snow": "❄️",
+    "Mist": "🌫️",
+    "Fog": "🌫️",
+    "Haze": "🌫️",
+    "Smoke": "🌫️",
+    "Dust": "🌫️",
+    "Sand": "🌫️",
+    "Ash": "🌫️",
+    "Squall": "💨",
+    "Tornado": "🌪️"
+}
+
 def test_temperature_conversion():
     """Test temperature conversion from Kelvin to Celsius and Fahrenheit."""
     # Kelvin temperature (example: 295.15K is about 22°C or 71.6°F)
@@ -42,32 +69,8 @@ def test_wind_speed_description():
     """Test wind speed description based on the Beaufort scale."""
     def get_wind_description(speed_ms):
         """Get wind description based on speed in m/s."""
-        if speed_ms < 0.5:
-            return "Calm"
-        elif speed_ms < 1.5:
-            return "Light air"
-        elif speed_ms < 3.3:
-            return "Light breeze"
-        elif speed_ms < 5.5:
-            return "Gentle breeze"
-        elif speed_ms < 7.9:
-            return "Moderate breeze"
-        elif speed_ms < 10.7:
-            return "Fresh breeze"
-        elif speed_ms < 13.8:
-            return "Strong breeze"
-        elif speed_ms < 17.1:
-            return "High wind"
-        elif speed_ms < 20.7:
-            return "Gale"
-        elif speed_ms < 24.4:
-            return "Strong gale"
-        elif speed_ms < 28.4:
-            return "Storm"
-        elif speed_ms < 32.6:
-            return "Violent storm"
-        else:
-            return "Hurricane force"
+        # A speed equal to a threshold belongs to the stronger band, hence bisect_right
+        return WIND_LABELS[bisect.bisect_right(WIND_THRESHOLDS, speed_ms)]
     
     # Test various wind speeds
     assert get_wind_description(0.3) == "Calm"
@@ -83,29 +86,16 @@ def test_wind_speed_description():
     assert get_wind_description(26.0) == "Storm"
     assert get_wind_description(30.0) == "Violent storm"
     assert get_wind_description(35.0) == "Hurricane force"
+    
+    # Test the band boundaries
+    assert get_wind_description(0.5) == "Light air"
+    assert get_wind_description(32.6) == "Hurricane force"
 
 def test_weather_icon_mapping():
     """Test mapping of weather conditions to appropriate icons."""
     def get_weather_icon(condition):
         """Get weather icon based on condition."""
-        icons = {
-            "Clear": "☀️",
-            "Clouds": "☁️",
-            "Rain": "🌧️",
-            "Drizzle": "🌦️",
-            "Thunderstorm": "⛈️",
-            "Snow": "❄️",
-            "Mist": "🌫️",
-            "Fog": "🌫️",
-            "Haze": "🌫️",
-            "Smoke": "🌫️",
-            "Dust": "🌫️",
-            "Sand": "🌫️",
-            "Ash": "🌫️",
-            "Squall": "💨",
-            "Tornado": "🌪️"
-        }
-        return icons.get(condition, "❓")
+        return WEATHER_ICONS.get(condition, "❓")
     
     # Test various weather conditions
     assert get_weather_icon("Clear") == "☀️"
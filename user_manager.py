@@ -1,5 +1,6 @@
 import os
 import hashlib
+import hmac
 import secrets
 from typing import Dict, Optional
 from pymongo import MongoClient
@@ -20,15 +21,17 @@ class UserManager:
         self,
         connection_string: str = None,
         database_name: str = None,
-        collection_name: str = "users"  # Separate collection for users
+        collection_name: str = "users",  # Separate collection for users
+        client: Optional[MongoClient] = None
     ):
         # Use provided connection details or fall back to environment variables
         self.connection_string = connection_string or os.getenv("MONGO_URI")
         self.database_name = database_name or os.getenv("MONGO_DB")
         self.collection_name = collection_name
         
-        # Connect to MongoDB
-        self.client = MongoClient(self.connection_string)
+        # Connect to MongoDB, reusing a shared client when one is provided
+        self._owns_client = client is None
+        self.client = client if client is not None else MongoClient(self.connection_string)
         self.db = self.client[self.database_name]
         self.users = self.db[self.collection_name]
         
@@ -71,7 +74,7 @@ class UserManager:
             True if registration successful, False otherwise
         """
         # Check if username already exists
-        if self.users.find_one({"username": username}):
+        if self.user_exists(username):
             return False
         
         # Hash the password
@@ -103,16 +106,16 @@ class UserManager:
         Returns:
             True if authentication successful, False otherwise
         """
-        # Find the user
-        user = self.users.find_one({"username": username})
+        # Find the user, fetching only the fields needed to check the password
+        user = self.users.find_one({"username": username}, {"salt": 1, "password_hash": 1, "_id": 0})
         if not user:
             return False
         
         # Hash the provided password with the stored salt
         password_data = self._hash_password(password, user["salt"])
         
-        # Compare the hashes
-        return password_data["hash"] == user["password_hash"]
+        # Compare the hashes in constant time
+        return hmac.compare_digest(password_data["hash"], user["password_hash"])
     
     def delete_user(self, username: str) -> bool:
         """
@@ -137,4 +140,9 @@ class UserManager:
         Returns:
             True if user exists, False otherwise
         """
-        return self.users.find_one({"username": username}) is not None 
\ No newline at end of file
+        return self.users.count_documents({"username": username}, limit=1) > 0
+    
+    def close(self):
+        """Close the MongoDB client if this manager created it."""
+        if self._owns_client:
+            self.client.close()
@@ -1,10 +1,10 @@
 import os
 import datetime
-import re
+import functools
 from dotenv import load_dotenv
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_openai import ChatOpenAI
-from langchain.tools import tool
+from langchain.tools import StructuredTool
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain import hub
 from openweather_api import OpenWeather
@@ -24,11 +24,17 @@ weather_client = OpenWeather()
 # Default user ID (can be replaced with actual user authentication)
 DEFAULT_USER_ID = "test_user"
 
-# Get today's date
-TODAY_DATE = datetime.datetime.now().strftime("%A, %B %d, %Y")
 
-@tool
-def get_current_weather(city: str, country_code: str = None) -> str:
+def set_http_client(http_client):
+    """
+    Use a shared async HTTP client for the weather tools' OpenWeather calls.
+    
+    Args:
+        http_client (httpx.AsyncClient): The client to use, or None to fall back to blocking requests
+    """
+    weather_client.http_client = http_client
+
+def _current_weather(city: str, country_code: str = None) -> str:
     """
     Get the current weather for a specific city.
     
@@ -51,8 +57,21 @@ def get_current_weather(city: str, country_code: str = None) -> str:
 
     return weather_client.format_current_weather(weather_data, city, country_code)
 
-@tool
-def get_weather_forecast(city: str, country_code: str = None) -> str:
+async def _acurrent_weather(city: str, country_code: str = None) -> str:
+    """Async version of _current_weather."""
+    location = await weather_client.aget_geolocation(city, country_code)
+    if not location:
+        return f"❌ Sorry, I couldn't find location information for **{city}**."
+
+    lat, lon = location[0]["lat"], location[0]["lon"]
+    weather_data = await weather_client.aget_current_weather(lat, lon)
+
+    if not weather_data:
+        return f"⚠️ Weather data for **{city}** is currently unavailable."
+
+    return weather_client.format_current_weather(weather_data, city, country_code)
+
+def _weather_forecast(city: str, country_code: str = None) -> str:
     """
     Get a 5-day weather forecast for a specific city.
     
@@ -75,25 +94,46 @@ def get_weather_forecast(city: str, country_code: str = None) -> str:
 
     return weather_client.format_forecast(forecast_data, city, country_code)
 
+async def _aweather_forecast(city: str, country_code: str = None) -> str:
+    """Async version of _weather_forecast."""
+    location = await weather_client.aget_geolocation(city, country_code)
+    if not location:
+        return f"❌ Sorry, I couldn't find location information for **{city}**."
+
+    lat, lon = location[0]["lat"], location[0]["lon"]
+    forecast_data = await weather_client.aget_forecast(lat, lon)
 
-# Create the LangChain agent
-def create_weather_agent(user_id=DEFAULT_USER_ID, k=3):
+    if not forecast_data:
+        return f"⚠️ Forecast data for **{city}** is currently unavailable."
+
+    return weather_client.format_forecast(forecast_data, city, country_code)
+
+# Tools expose both a blocking and an async implementation; the agent uses the
+# async one when invoked with ainvoke/astream_events so HTTP calls don't block
+get_current_weather = StructuredTool.from_function(
+    func=_current_weather,
+    coroutine=_acurrent_weather,
+    name="get_current_weather",
+)
+
+get_weather_forecast = StructuredTool.from_function(
+    func=_weather_forecast,
+    coroutine=_aweather_forecast,
+    name="get_weather_forecast",
+)
+
+
+@functools.lru_cache(maxsize=1)
+def build_llm():
     """
-    Create a LangChain agent for weather queries with MongoDB memory.
+    Build the chat model shared by all agents in this process.
     
-    Args:
-        user_id (str, optional): User ID for the conversation memory
-        k (int, optional): Number of past messages to remember
-        
     Returns:
-        tuple: (agent_with_memory, memory) - The agent with memory and the memory instance
+        ChatOpenAI: The language model
     """
-    logger.info(f"Creating weather agent for user {user_id}")
-    
-    # Initialize the language model
     try:
         model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
-        logger.debug(f"Initializing language model: {model_name}")
+        logger.debug("Initializing language model: %s", model_name)
         
         llm = ChatOpenAI(
             model=model_name,
@@ -101,15 +141,30 @@ def create_weather_agent(user_id=DEFAULT_USER_ID, k=3):
             api_key=os.getenv("OPENAI_API_KEY")
         )
         logger.debug("Language model initialized successfully")
+        return llm
     except Exception as e:
-        logger.error(f"Failed to initialize language model: {str(e)}")
+        logger.error("Failed to initialize language model: %s", str(e))
         raise
+
+@functools.lru_cache(maxsize=1)
+def build_tools():
+    """
+    Build the tool list shared by all agents in this process.
     
-    # Define the tools
+    Returns:
+        tuple: The weather tools available to the agent
+    """
     logger.debug("Setting up agent tools")
-    tools = [get_current_weather, get_weather_forecast]
+    return (get_current_weather, get_weather_forecast)
+
+@functools.lru_cache(maxsize=1)
+def build_prompt():
+    """
+    Get the weather agent prompt from the PromptCache.
     
-    # Get the prompt from the PromptCache
+    Returns:
+        ChatPromptTemplate: The agent prompt
+    """
     logger.debug("Getting prompt from cache")
     prompt_cache = PromptCache()
     prompt = prompt_cache.get_prompt("weather_agent")
@@ -119,6 +174,56 @@ def create_weather_agent(user_id=DEFAULT_USER_ID, k=3):
         logger.warning("Weather agent prompt not found in cache, creating default prompt")
         prompt = prompt_cache.create_default_weather_prompt()
     
+    return prompt
+
+# The shared agent executor and the day it was built for
+_agent_executor = (None, None)
+
+def current_agent_executor():
+    """
+    Get the shared agent executor if it is already built for today.
+    
+    Unlike build_agent_executor this never builds one, so it is cheap enough
+    to call on an event loop.
+    
+    Returns:
+        AgentExecutor or None: Today's executor, or None if it still has to be built
+    """
+    day, agent_executor = _agent_executor
+    return agent_executor if day == datetime.date.today() else None
+
+def build_agent_executor():
+    """
+    Get the agent executor shared by all users in this process.
+    
+    The executor itself holds no per-user state; conversation history is
+    attached per user by wrapping it with that user's memory. It is built
+    once per day, since its prompt carries today's date.
+    
+    Returns:
+        AgentExecutor: The weather agent executor
+    """
+    global _agent_executor
+    agent_executor = current_agent_executor()
+    if agent_executor is None:
+        day = datetime.date.today()
+        agent_executor = _build_agent_executor()
+        _agent_executor = (day, agent_executor)
+    return agent_executor
+
+def _build_agent_executor():
+    """
+    Build the agent executor with today's prompt.
+    
+    Returns:
+        AgentExecutor: The weather agent executor
+    """
+    llm = build_llm()
+    tools = list(build_tools())
+    # A new day needs the prompt with its date, so don't reuse the previous day's
+    build_prompt.cache_clear()
+    prompt = build_prompt()
+    
     # Check if the prompt uses 'question' instead of 'input'
     input_mapping = {}
     if "question" in prompt.input_variables and "input" not in prompt.input_variables:
@@ -131,7 +236,7 @@ def create_weather_agent(user_id=DEFAULT_USER_ID, k=3):
         agent = create_openai_tools_agent(llm, tools, prompt)
         logger.debug("Agent created successfully")
     except Exception as e:
-        logger.error(f"Failed to create agent: {str(e)}")
+        logger.error("Failed to create agent: %s", str(e))
         raise
 
     # Create the agent executor
@@ -146,68 +251,101 @@ def create_weather_agent(user_id=DEFAULT_USER_ID, k=3):
         )
         logger.debug("Agent executor created successfully")
     except Exception as e:
-        logger.error(f"Failed to create agent executor: {str(e)}")
+        logger.error("Failed to create agent executor: %s", str(e))
         raise
     
+    return agent_executor
+
+def reset_agent_components():
+    """Drop the shared prompt and executor so they are rebuilt, e.g. after a prompt update."""
+    global _agent_executor
+    build_prompt.cache_clear()
+    _agent_executor = (None, None)
+
+# Create the LangChain agent
+def create_weather_agent(user_id=DEFAULT_USER_ID, k=3):
+    """
+    Create a LangChain agent for weather queries with MongoDB memory.
+    
+    The model, tools, prompt and executor are shared process-wide; only the
+    memory and its history wrapper are created per user.
+    
+    Args:
+        user_id (str, optional): User ID for the conversation memory
+        k (int, optional): Number of past messages to remember
+        
+    Returns:
+        tuple: (agent_with_memory, memory) - The agent with memory and the memory instance
+    """
+    logger.info("Creating weather agent for user %s", user_id)
+    
+    agent_executor = build_agent_executor()
+    
     # Initialize MongoDB memory
     try:
-        logger.debug(f"Initializing MongoDB memory with k={k}")
-        memory = MongoDBConversationMemory(
-            user_id=user_id,
-            connection_string=os.getenv("MONGO_URI"),
-            database_name=os.getenv("MONGO_DB"),
-            collection_name=os.getenv("MONGO_COLLECTION"),
-            k=k
-        )
+        logger.debug("Initializing MongoDB memory with k=%s", k)
+        # Connection details default to the shared client and environment settings
+        memory = MongoDBConversationMemory(user_id=user_id, k=k)
         logger.debug("MongoDB memory initialized successfully")
     except Exception as e:
-        logger.error(f"Failed to initialize MongoDB memory: {str(e)}")
+        logger.error("Failed to initialize MongoDB memory: %s", str(e))
         raise
     
     # Wrap the agent executor with message history
     try:
         logger.debug("Creating runnable with history")
         agent_with_memory = memory.create_runnable_with_history(agent_executor)
-        logger.info(f"Weather agent created successfully for user {user_id}")
+        logger.info("Weather agent created successfully for user %s", user_id)
     except Exception as e:
-        logger.error(f"Failed to create runnable with history: {str(e)}")
+        logger.error("Failed to create runnable with history: %s", str(e))
         raise
     
     return agent_with_memory, memory
 
 if __name__ == "__main__":
+    # Line editing and up-arrow history for input(), where the platform has readline
+    try:
+        import readline  # noqa: F401
+    except ImportError:
+        pass
+    
     # Create the weather agent with memory
     logger.info("Starting Weather Assistant CLI")
     
     try:
         weather_agent, memory = create_weather_agent(DEFAULT_USER_ID)
-        logger.info(f"Weather agent created successfully for user {DEFAULT_USER_ID}")
+        logger.info("Weather agent created successfully for user %s", DEFAULT_USER_ID)
         
         print("🌦️ Welcome to the Weather Assistant! 🌦️")
-        print("Today is:", TODAY_DATE)
+        print("Today is:", datetime.datetime.now().strftime("%A, %B %d, %Y"))
         print("You can ask about current weather and forecasts.")
         print("Type 'exit' to quit.")
 
         while True:
-            user_input = input("What would you like to know about the weather? ")
+            try:
+                user_input = input("What would you like to know about the weather? ")
+            except (EOFError, KeyboardInterrupt):
+                # Ctrl-D / Ctrl-C at the prompt ends the session like 'exit'
+                user_input = "exit"
+                print()
             if user_input.lower() in ["exit", "quit", "bye"]:
                 logger.info("User requested to exit")
                 print("👋 Goodbye! Stay safe and check the weather before heading out!")
                 break
             
-            logger.info(f"Processing user query: {user_input}")
+            logger.info("Processing user query: %s", user_input)
             
             try:
                 response = weather_agent.invoke({"input": user_input})
                 response_output = response["output"]
                 
                 logger.info("Successfully generated response")
-                logger.debug(f"Response: {response_output}")
+                logger.debug("Response: %s", response_output)
                 
                 print("\n📢 Response:", response_output, "\n")
             except Exception as e:
-                logger.error(f"Error processing query: {str(e)}", exc_info=True)
+                logger.error("Error processing query: %s", str(e), exc_info=True)
                 print(f"❌ An error occurred: {e}")
     except Exception as e:
-        logger.critical(f"Failed to start Weather Assistant: {str(e)}", exc_info=True)
+        logger.critical("Failed to start Weather Assistant: %s", str(e), exc_info=True)
         print(f"❌ Failed to start Weather Assistant: {e}")